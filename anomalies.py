@@ -0,0 +1,125 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from cube import roll_up
+
+# One row per series, one column per month (gaps filled with 0) for a single metric
+SeriesMatrix = namedtuple("SeriesMatrix", ["labels", "months", "values"])
+
+# Series levels scanned by default: label column and the cube column it rolls up from
+levels = {
+    "Product": "ProductName",
+    "Store": "StoreKey",
+    "State": "State",
+}
+
+
+# Pivot the cube into a dense series x month matrix with integer codes, no per-series groupby
+def series_matrix(sales_cube, by, metric="Revenue", dimensions=None):
+    months = pd.date_range(sales_cube["Month"].min(), sales_cube["Month"].max(), freq="MS")
+    totals = roll_up(sales_cube, [by, "Month"], [metric], dimensions)
+    rows, labels = pd.factorize(totals[by], sort=True)
+    columns = months.get_indexer(totals["Month"])
+    values = np.zeros((len(labels), len(months)))
+    values[rows, columns] = totals[metric].to_numpy(dtype="float64")
+    return SeriesMatrix(labels, months, values)
+
+
+# Divide each series by its own quarter factors (quarter mean / overall mean), so the Q4 peak
+# and the Q1 trough are not read as anomalies; returns the adjusted values and the factors per column
+def seasonal_adjust(matrix):
+    quarter = (matrix.months.quarter - 1).to_numpy()
+    counts = np.bincount(quarter, minlength=4)
+    quarter_means = np.stack([matrix.values[:, quarter == q].sum(axis=1) for q in range(4)], axis=1) / np.maximum(counts, 1)
+    overall = matrix.values.mean(axis=1, keepdims=True)
+    factors = np.divide(quarter_means, overall, out=np.ones_like(quarter_means), where=overall > 0)
+    factors = np.where((factors > 0) & (counts > 0), factors, 1.0)[:, quarter]
+    return matrix.values / factors, factors
+
+
+# Sum of the previous `window` months for every cell (NaN for the first `window` months)
+def trailing_sum(values, window):
+    sums = np.cumsum(np.pad(values, ((0, 0), (1, 0))), axis=1)
+    totals = np.full(values.shape, np.nan)
+    if values.shape[1] > window:
+        totals[:, window:] = sums[:, window:-1] - sums[:, :-window - 1]
+    return totals
+
+
+# Median and scaled median absolute deviation of the previous `window` months for every cell
+# (NaN for the first `window` months), batched over sliding windows of the whole matrix
+def rolling_baseline(values, window):
+    median = np.full(values.shape, np.nan)
+    spread = np.full(values.shape, np.nan)
+    if values.shape[1] > window:
+        windows = sliding_window_view(values[:, :-1], window, axis=1)
+        median[:, window:] = np.median(windows, axis=2)
+        spread[:, window:] = 1.4826 * np.median(np.abs(windows - median[:, window:, None]), axis=2)
+    return median, spread
+
+
+# Robust z-score of every (series, month) cell against its seasonally adjusted trailing baseline,
+# on log values so a collapse towards zero scores as far below as a surge of the same factor
+# scores above. Cells whose window had sales in fewer than min_active of its months are not
+# scored, as sparse series (most single products) would otherwise flag every sale as a spike.
+def score(matrix, window=12, min_active=0.75):
+    adjusted, factors = seasonal_adjust(matrix)
+    logs = np.log1p(adjusted)
+    median, spread = rolling_baseline(logs, window)
+    active = trailing_sum((matrix.values > 0).astype("float64"), window) / window
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z_scores = np.where((spread > 0) & (active >= min_active), (logs - median) / spread, np.nan)
+    return z_scores, np.expm1(median) * factors
+
+
+# Cells beyond the threshold for one series level, as a long table
+def detect(matrix, level, window=12, threshold=3.0, min_active=0.75):
+    z_scores, expected = score(matrix, window, min_active)
+    rows, columns = np.nonzero(np.abs(np.nan_to_num(z_scores)) >= threshold)
+    found = pd.DataFrame({
+        "Level": level,
+        "Series": matrix.labels.astype(str)[rows],
+        "Month": matrix.months[columns],
+        "Value": matrix.values[rows, columns],
+        "Expected": expected[rows, columns],
+        "Z_Score": z_scores[rows, columns],
+    })
+    found["Kind"] = np.where(found["Z_Score"] < 0, "Dip", "Spike")
+    return found
+
+
+anomaly_columns = ["Level", "Series", "Month", "Value", "Expected", "Z_Score", "Kind"]
+
+
+# Every product, store and state series at once, ranked by how far each cell strays from its baseline
+def ranked_anomalies(sales_cube, dimensions, metric="Revenue", window=12, threshold=3.0, min_active=0.75):
+    # A slice with no sales has no months to build series over
+    if sales_cube.empty:
+        return pd.DataFrame(columns=anomaly_columns)
+    found = [
+        detect(series_matrix(sales_cube, by, metric, dimensions), level, window, threshold, min_active)
+        for level, by in levels.items()
+    ]
+    anomalies = pd.concat(found, ignore_index=True)
+    order = np.argsort(-np.abs(anomalies["Z_Score"].to_numpy()), kind="stable")
+    return anomalies.iloc[order].reset_index(drop=True)
+
+
+# Check the detector against a known collapse: at every level, at least min_share of the series
+# scored in the given months must come out as dips. Prints the shares; returns True on a failure.
+def verify_dips(sales_cube, dimensions, months=("2020-03", "2020-04"), min_share=0.5, metric="Revenue", window=12, threshold=3.0, min_active=0.75):
+    failed = False
+    for level, by in levels.items():
+        matrix = series_matrix(sales_cube, by, metric, dimensions)
+        z_scores, _ = score(matrix, window, min_active)
+        columns = matrix.months.get_indexer(pd.to_datetime(list(months)))
+        z_scores = z_scores[:, columns[columns >= 0]]
+        scored = int((~np.isnan(z_scores)).sum())
+        dips = int((np.nan_to_num(z_scores) <= -threshold).sum())
+        share = dips / scored if scored else 0.0
+        print(f"{level}: {dips} of {scored} scored cells in {', '.join(months)} are dips ({share:.0%})")
+        failed = failed or share < min_share
+    return failed
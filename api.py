@@ -0,0 +1,206 @@
+import threading
+import time
+import weakref
+
+import numpy as np
+import pandas as pd
+
+import pipeline
+import reports
+from ingest import fact_watermarks
+from result_cache import ResultCache
+from store_efficiency import StoreMonths
+
+# Loaded once per data version; every call slices these instead of reloading
+base_tasks = ["sales_data", "sales_cube", "dimensions", "product_data", "stores_data"]
+
+# Outputs kept up to date over the full history from the source; a slice rebuilds them from its cube
+history_tasks = {
+    "store_months": lambda sales_cube: StoreMonths().add(sales_cube),
+}
+
+
+# Inclusive (start, end) range, widened to whole months as the cube is monthly
+def normalize_date_range(date_range):
+    if date_range is None:
+        return None
+    start, end = date_range
+    start = None if start is None else pd.Timestamp(start).to_period("M").to_timestamp()
+    end = None if end is None else pd.Timestamp(end).to_period("M").to_timestamp()
+    return (start, end)
+
+
+# {column: value or values} as a sorted tuple, so equal filters give equal cache keys
+def normalize_filters(filters):
+    normalized = []
+    for column, values in sorted((filters or {}).items()):
+        if isinstance(values, (list, tuple, set, frozenset, pd.Index, pd.Series, np.ndarray)):
+            values = tuple(sorted(set(values), key=str))
+        else:
+            values = (values,)
+        normalized.append((column, values))
+    return tuple(normalized)
+
+
+def normalize_settings(k, settings):
+    unknown = set(settings) - set(reports.default_settings)
+    if unknown:
+        raise ValueError(f"Unknown report settings: {', '.join(sorted(unknown))}")
+    merged = {**reports.default_settings, **settings}
+    if k is not None:
+        merged["top_n"] = k
+    merged["years"] = tuple(merged["years"])
+    merged["quarters"] = tuple(merged["quarters"])
+    return merged
+
+
+# Rows of a cube or order-line frame whose column (own or via a dimension) is in values
+def filter_mask(data, column, values, dimensions):
+    if column in data.columns:
+        return data[column].isin(values)
+    if column in ("Year", "Quarter", "Month") and "Order_Date" in data.columns:
+        order_date = pd.to_datetime(data["Order_Date"])
+        parts = {"Year": order_date.dt.year, "Quarter": order_date.dt.quarter, "Month": order_date.dt.to_period("M").dt.to_timestamp()}
+        return parts[column].isin(values)
+    for key, lookup in dimensions.items():
+        if column in lookup.columns:
+            return data[key].isin(lookup.index[lookup[column].isin(values)])
+    raise ValueError(f"Unknown filter column: {column}")
+
+
+def slice_frame(data, date_range, filters, dimensions):
+    mask = np.ones(len(data), dtype=bool)
+    if date_range is not None:
+        start, end = date_range
+        month = data["Month"] if "Month" in data.columns else pd.to_datetime(data["Order_Date"]).dt.to_period("M").dt.to_timestamp()
+        if start is not None:
+            mask &= (month >= start).to_numpy()
+        if end is not None:
+            mask &= (month <= end).to_numpy()
+    for column, values in filters:
+        mask &= filter_mask(data, column, values, dimensions).to_numpy()
+    return data if mask.all() else data[mask]
+
+
+# Programmatic access to the reports: DataFrames for any slice, memoized per data version
+class ReportService:
+    def __init__(self, source, max_entries=128, max_bytes=256 * 1024 ** 2, version_interval=30.0, dimension_interval=600.0):
+        self.source = source
+        self.cache = ResultCache(max_entries=max_entries, max_bytes=max_bytes)
+        # Version queries hit the database, so they are only repeated after these many seconds:
+        # the fact tables' watermarks often, the dimension tables' full-table fingerprints rarely
+        self.intervals = {"facts": version_interval, "dimensions": dimension_interval}
+        self.tables = {
+            "facts": {name: columns for name, columns in reports.tables.items() if name in fact_watermarks},
+            "dimensions": {name: columns for name, columns in reports.tables.items() if name not in fact_watermarks},
+        }
+        self.versions = {}
+        self.checked_at = {}
+        self.version = None
+        self.base = None
+        self.lock = threading.Lock()
+
+    def data_version(self):
+        now = time.monotonic()
+        for part, interval in self.intervals.items():
+            if part not in self.checked_at or now - self.checked_at[part] >= interval:
+                self.versions[part] = self.source.data_version(self.tables[part])
+                self.checked_at[part] = now
+        version = (self.versions["facts"], self.versions["dimensions"])
+        if version != self.version:
+            # Results for the old data can never be asked for again
+            self.version = version
+            self.base = None
+            self.cache.clear()
+        return self.version
+
+    # (version, base) read together, so a result is never cached under a newer version than its data
+    def base_values(self):
+        with self.lock:
+            self.data_version()
+            if self.base is None:
+                self.base = pipeline.run(base_tasks, provided={"source": self.source})
+            return self.version, self.base
+
+    # Check every table's version now rather than after its interval, reloading if one moved
+    def refresh(self):
+        with self.lock:
+            self.checked_at = {}
+        return self.base_values()
+
+    # Frames the named report is built from, e.g. {"state_performance": ..., "top_states_combined": ...}
+    def report(self, name, date_range=None, filters=None, k=None, **settings):
+        result = self.lookup("frames", name, date_range, filters, k, settings)
+        return {output: frame.copy() for output, frame in result.items()}
+
+    # The report's charts for the same slice, {filename: ChartSpec}
+    def charts(self, name, date_range=None, filters=None, k=None, **settings):
+        return self.lookup("charts", name, date_range, filters, k, settings)
+
+    def lookup(self, kind, name, date_range, filters, k, settings):
+        if name not in reports.report_names:
+            raise ValueError(f"Unknown report: {name}")
+        date_range = normalize_date_range(date_range)
+        filters = normalize_filters(filters)
+        settings = normalize_settings(k, settings)
+        version, base = self.base_values()
+        key = (kind, name, date_range, filters, tuple(sorted(settings.items())), version)
+
+        result = self.cache.get(key)
+        if result is None:
+            result = self.compute(kind, name, date_range, filters, settings, base)
+            self.cache.put(key, result)
+        return result
+
+    def compute(self, kind, name, date_range, filters, settings, base):
+        target = reports.report_task(name)
+        if kind == "charts":
+            outputs = [target]
+        else:
+            outputs = [output for output in pipeline.registry[target].inputs if output not in base]
+        provided = {**base, "source": self.source, "report_settings": settings}
+        if date_range is not None or filters:
+            provided["sales_cube"] = slice_frame(base["sales_cube"], date_range, filters, base["dimensions"])
+
+        order = pipeline.resolve_order(outputs, provided)
+        if date_range is not None or filters:
+            if any("sales_data" in pipeline.registry[step].inputs for step in order):
+                provided["sales_data"] = slice_frame(base["sales_data"], date_range, filters, base["dimensions"])
+            for step in set(order) & set(history_tasks):
+                provided[step] = history_tasks[step](provided["sales_cube"])
+            order = pipeline.resolve_order(outputs, provided)
+        # Tables read straight from the source (customers, exchange rates) are kept with the base
+        for step in order:
+            if pipeline.registry[step].inputs == ("source",):
+                with self.lock:
+                    if step not in base:
+                        base[step] = pipeline.run([step], provided={"source": self.source})[step]
+                provided[step] = base[step]
+
+        values = pipeline.run(outputs, provided=provided)
+        if kind == "charts":
+            return {spec.filename: spec for spec in values[target].charts}
+        return {output: value for output, value in values.items() if isinstance(value, pd.DataFrame)}
+
+
+services = weakref.WeakKeyDictionary()
+
+
+def service_for(source):
+    if source not in services:
+        services[source] = ReportService(source)
+    return services[source]
+
+
+default_source = None
+
+
+# report("states", date_range=("2019-01", "2019-12"), filters={"Country": "Germany"}, k=10)
+def report(name, date_range=None, filters=None, k=None, source=None, **settings):
+    global default_source
+    if source is None:
+        if default_source is None:
+            from visualizations import build_source
+            default_source = build_source()
+        source = default_source
+    return service_for(source).report(name, date_range=date_range, filters=filters, k=k, **settings)
@@ -0,0 +1,126 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+import data_cache
+import instrumentation
+import pipeline
+import reports
+from benchmarks.synthetic import make_tables, write_tables
+from data_sources import ParquetSource
+from rendering import render_charts
+
+results_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# Stages reported per scale, mapped to the pipeline tasks that implement them
+stage_tasks = {
+    "load": ["raw_tables"],
+    "product_merge": ["product_data", "sales_cube"],
+    "monthly": ["monthly_sales"],
+    "regional": ["region_revenue"],
+    "products": ["top_products", "top_products_quantity", "top_products_profitability", "yearly_top_products", "top_5_products_profit", "top_5_products_quantity"],
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_scale(scale, work_dir, charts=True, seed=0):
+    parquet_dir = os.path.join(work_dir, f"scale_{scale}")
+    tables = make_tables(scale, seed=seed)
+    write_tables(tables, parquet_dir)
+    sales_rows = tables["proj_sales"].shape[0]
+    del tables
+
+    instrumentation.start(track_memory=False)
+    targets = [reports.report_task(name) for name in reports.report_names]
+    results = pipeline.run(targets, provided={"source": ParquetSource(parquet_dir)})
+    if charts:
+        specs = [spec for target in targets for spec in results[target].charts]
+        with instrumentation.stage("charts"):
+            render_charts(specs, os.path.join(work_dir, f"charts_{scale}"), use_cache=False)
+
+    task_seconds = {
+        record["stage"][len("task:"):]: record["seconds"]
+        for record in instrumentation.records if record["stage"].startswith("task:")
+    }
+    stages = {stage: round(sum(task_seconds.get(name, 0) for name in names), 6) for stage, names in stage_tasks.items()}
+    if charts:
+        stages["charts"] = next(record["seconds"] for record in instrumentation.records if record["stage"] == "charts")
+    return {"scale": scale, "sales_rows": sales_rows, "stages": stages, "tasks": task_seconds}
+
+
+def run(scales, charts=True, seed=0):
+    run_result = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "seed": seed,
+        "scales": [],
+    }
+    # Caches the reports keep (partitions, store x month matrices) go to the work directory,
+    # so synthetic data never replaces the ones built from the real tables
+    real_cache_dir = data_cache.cache_dir
+    with tempfile.TemporaryDirectory() as work_dir:
+        data_cache.cache_dir = os.path.join(work_dir, "cache")
+        try:
+            for scale in scales:
+                result = run_scale(scale, work_dir, charts=charts, seed=seed)
+                run_result["scales"].append(result)
+                print(f"scale {scale}x ({result['sales_rows']} rows): " + ", ".join(f"{stage} {seconds:.3f}s" for stage, seconds in result["stages"].items()))
+        finally:
+            data_cache.cache_dir = real_cache_dir
+
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, f"{run_result['timestamp'].replace(':', '')}_{run_result['commit']}.json")
+    with open(path, "w") as f:
+        json.dump(run_result, f, indent=2)
+    print(f"Saved results to {path}")
+    return path
+
+
+# Stage-by-stage ratio of two saved runs (new / old) for every scale they share
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    old_scales = {result["scale"]: result for result in old["scales"]}
+    print(f"{old['commit']} -> {new['commit']}")
+    for result in new["scales"]:
+        previous = old_scales.get(result["scale"])
+        if previous is None:
+            continue
+        for stage, seconds in result["stages"].items():
+            before = previous["stages"].get(stage)
+            if before:
+                print(f"  {result['scale']:>5}x {stage:<14} {before:9.3f}s -> {seconds:9.3f}s  ({seconds / before:5.2f}x)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline on synthetic data")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 10, 100], help="multiples of the shipped proj_sales size")
+    parser.add_argument("--no-charts", action="store_true", help="skip chart rendering")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two saved result files")
+    args = parser.parse_args(argv)
+    if args.compare:
+        compare(*args.compare)
+    else:
+        run(args.scales, charts=not args.no_charts, seed=args.seed)
+
+
+if __name__ == "__main__":
+    main()
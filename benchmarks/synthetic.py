@@ -0,0 +1,104 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Size of the shipped workbooks in data/; scale multiplies the fact tables only
+base_sales_rows = 62884
+base_customers = 15266
+product_count = 2517
+store_count = 67
+start_date = "2016-01-01"
+end_date = "2021-02-20"
+
+countries = {
+    "United States": "USD",
+    "Canada": "CAD",
+    "Australia": "AUD",
+    "United Kingdom": "GBP",
+    "Germany": "EUR",
+    "France": "EUR",
+    "Italy": "EUR",
+    "Netherlands": "EUR",
+}
+categories = ["Audio", "Cameras", "Cell phones", "Computers", "Games and Toys", "Home Appliances", "Music, Movies and Audio Books", "TV and Video"]
+
+
+def make_products(rng):
+    price = np.round(rng.lognormal(mean=4.5, sigma=1.0, size=product_count), 2)
+    return pd.DataFrame({
+        "ProductKey": np.arange(1, product_count + 1),
+        "Product_Name": [f"Synthetic Product {key}" for key in range(1, product_count + 1)],
+        "Unit_Price_USD": price,
+        "Unit_Cost_USD": np.round(price * rng.uniform(0.3, 0.6, size=product_count), 2),
+        "Category": rng.choice(categories, size=product_count),
+    })
+
+
+def make_stores(rng):
+    country = rng.choice(list(countries), size=store_count)
+    return pd.DataFrame({
+        "StoreKey": np.arange(1, store_count + 1),
+        "State": [f"State {key}" for key in range(1, store_count + 1)],
+        "Country": country,
+        "Square_Meters": rng.integers(200, 2500, size=store_count).astype("float64"),
+    })
+
+
+def make_customers(rng, scale):
+    rows = int(base_customers * scale)
+    birthday = pd.Timestamp("1940-01-01") + pd.to_timedelta(rng.integers(0, 60 * 365, size=rows), unit="D")
+    return pd.DataFrame({
+        "CustomerKey": np.arange(1, rows + 1),
+        "Name": [f"Customer {key}" for key in range(1, rows + 1)],
+        "Birthday": birthday,
+    })
+
+
+def make_exchange_rates(rng):
+    dates = pd.date_range(start_date, end_date, freq="D")
+    frames = []
+    for currency in sorted(set(countries.values())):
+        level = 1.0 if currency == "USD" else rng.uniform(0.7, 1.5)
+        walk = np.exp(np.cumsum(rng.normal(0, 0.003, size=len(dates))))
+        frames.append(pd.DataFrame({"Date": dates, "Currency": currency, "Exchange": np.round(level * walk, 4) if currency != "USD" else 1.0}))
+    return pd.concat(frames, ignore_index=True)
+
+
+# Order lines sorted by date, several lines per order, keys drawn from the dimension tables
+def make_sales(rng, scale, stores):
+    rows = int(base_sales_rows * scale)
+    days = (pd.Timestamp(end_date) - pd.Timestamp(start_date)).days + 1
+    order_count = max(rows // 2, 1)
+    order_day = np.sort(rng.integers(0, days, size=order_count))
+    order_of_line = np.sort(rng.integers(0, order_count, size=rows))
+    store_of_order = rng.integers(0, store_count, size=order_count)
+    store_currency = stores["Country"].map(countries).to_numpy()
+    return pd.DataFrame({
+        "Order_Number": 366000 + order_of_line,
+        "Order_Date": pd.Timestamp(start_date) + pd.to_timedelta(order_day[order_of_line], unit="D"),
+        "Quantity": rng.integers(1, 11, size=rows),
+        "ProductKey": rng.integers(1, product_count + 1, size=rows),
+        "StoreKey": stores["StoreKey"].to_numpy()[store_of_order[order_of_line]],
+        "CustomerKey": rng.integers(1, int(base_customers * scale) + 1, size=rows),
+        "Currency_Code": store_currency[store_of_order[order_of_line]],
+    })
+
+
+def make_tables(scale=1, seed=0):
+    rng = np.random.default_rng(seed)
+    stores = make_stores(rng)
+    return {
+        "proj_products": make_products(rng),
+        "proj_stores": stores,
+        "proj_customers": make_customers(rng, scale),
+        "proj_exchange_rates": make_exchange_rates(rng),
+        "proj_sales": make_sales(rng, scale, stores),
+    }
+
+
+# Write the tables as {table}.parquet so ParquetSource can read them
+def write_tables(tables, parquet_dir):
+    os.makedirs(parquet_dir, exist_ok=True)
+    for table_name, data in tables.items():
+        data.to_parquet(os.path.join(parquet_dir, f"{table_name}.parquet"), index=False)
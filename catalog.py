@@ -0,0 +1,30 @@
+from collections import namedtuple
+
+# Report definitions shared by the CLI, the pipeline and the renderer. Kept free of pandas
+# and matplotlib so listing or serving cached reports starts without loading them.
+
+# What a report hands back: titled frames to print and charts to render
+Report = namedtuple("Report", ["tables", "charts"])
+
+# A chart to draw: kind is a key of charts.chart_kinds, data its first argument, params the rest
+ChartSpec = namedtuple("ChartSpec", ["kind", "filename", "data", "params"], defaults=[{}])
+
+# Reports selectable from the command line, in the order a full run produces them
+report_names = [
+    "monthly_trends",
+    "regional",
+    "dips",
+    "top_products",
+    "q1_q4_profit",
+    "q1_q4_quantity",
+    "top_products_by_year",
+    "states",
+    "currency",
+    "customers",
+    "anomalies",
+    "store_efficiency",
+]
+
+
+def report_task(report_name):
+    return f"report_{report_name}"
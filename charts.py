@@ -0,0 +1,230 @@
+import pandas as pd
+import matplotlib.pyplot as plt
+import seaborn as sns
+
+# Chart kinds: each one draws a single figure from a small, precomputed frame
+
+
+# Monthly revenue and profit with high/low periods annotated
+def monthly_trends(monthly_sales):
+    high_sales_period_revenue = monthly_sales.loc[monthly_sales['Revenue'].idxmax()]
+    low_sales_period_revenue = monthly_sales.loc[monthly_sales['Revenue'].idxmin()]
+
+    high_sales_period_profit = monthly_sales.loc[monthly_sales['Profit'].idxmax()]
+    low_sales_period_profit = monthly_sales.loc[monthly_sales['Profit'].idxmin()]
+
+    plt.figure(figsize=(14, 8))
+    sns.lineplot(data=monthly_sales, x='Month', y='Revenue', label='Revenue', color='blue', linewidth=2)
+    sns.lineplot(data=monthly_sales, x='Month', y='Profit', label='Profit', color='green', linewidth=2)
+
+    # Annotate high and low sales periods
+    plt.annotate(f"High Revenue: {high_sales_period_revenue['Month'].strftime('%Y-%m')}\n${high_sales_period_revenue['Revenue']:,.2f}",
+                 xy=(high_sales_period_revenue['Month'], high_sales_period_revenue['Revenue']),
+                 xytext=(high_sales_period_revenue['Month'], high_sales_period_revenue['Revenue'] + 500000),
+                 arrowprops=dict(facecolor='black', arrowstyle="->"), fontsize=10)
+
+    plt.annotate(f"Low Revenue: {low_sales_period_revenue['Month'].strftime('%Y-%m')}\n${low_sales_period_revenue['Revenue']:,.2f}",
+                 xy=(low_sales_period_revenue['Month'], low_sales_period_revenue['Revenue']),
+                 xytext=(low_sales_period_revenue['Month'] - pd.DateOffset(months=2), low_sales_period_revenue['Revenue'] - 1500000),
+                 arrowprops=dict(facecolor='red', arrowstyle="->"), fontsize=10)
+
+    plt.annotate(f"High Profit: {high_sales_period_profit['Month'].strftime('%Y-%m')}\n${high_sales_period_profit['Profit']:,.2f}",
+                 xy=(high_sales_period_profit['Month'], high_sales_period_profit['Profit']),
+                 xytext=(high_sales_period_profit['Month'] + pd.DateOffset(months=5), high_sales_period_profit['Profit'] + 700000),
+                 arrowprops=dict(facecolor='blue', arrowstyle="->"), fontsize=10)
+
+    plt.annotate(f"Low Profit: {low_sales_period_profit['Month'].strftime('%Y-%m')}\n${low_sales_period_profit['Profit']:,.2f}",
+                 xy=(low_sales_period_profit['Month'], low_sales_period_profit['Profit']),
+                 xytext=(low_sales_period_profit['Month'] - pd.DateOffset(months=5), low_sales_period_profit['Profit'] - 900000),
+                 arrowprops=dict(facecolor='orange', arrowstyle="->"), fontsize=10)
+
+    plt.title("Monthly Sales and Profit Trends with High/Low Periods")
+    plt.xlabel("Year")
+    plt.ylabel("Amount (USD)")
+    plt.legend()
+    plt.grid(True)
+    plt.xticks(rotation=45)
+    plt.tight_layout()
+
+
+def region_profit(region_revenue):
+    plt.figure(figsize=(12, 6))
+    sns.barplot(data=region_revenue, x='Profit', y='State', palette='coolwarm')
+    plt.title("Top 10 Regions by Profit")
+    plt.xlabel("Profit (USD)")
+    plt.ylabel("State")
+
+
+def dip_periods(dip_periods):
+    plt.figure(figsize=(12, 6))
+    sns.barplot(data=dip_periods, x='Month', y='Change', palette='Reds_d')
+    plt.title("Top Dip Periods in Revenue")
+    plt.xlabel("Date")
+    plt.ylabel("Revenue Change (USD)")
+    plt.xticks(rotation=45)
+    plt.grid(True)
+    plt.tight_layout()
+
+
+# Monthly line per product, legend in ranking order
+def product_trends(sales_trends, y, hue_order, title, ylabel, palette=None):
+    plt.figure(figsize=(14, 8))
+    sns.lineplot(data=sales_trends, x='Month', y=y, hue='ProductName', marker='o', palette=palette, hue_order=hue_order)
+    plt.title(title)
+    plt.xlabel("Year")
+    plt.ylabel(ylabel)
+    plt.legend(title="Product Name", loc='upper left', bbox_to_anchor=(1, 1))
+    plt.grid(True)
+    plt.tight_layout()
+
+
+# Q1 vs Q4 profit bars for one year, annotated with discount info
+def q1_q4_discounts(yearly_data, year, quarters=("Q1", "Q4")):
+    first, second = quarters
+    plt.figure(figsize=(12, 8))
+
+    # Create a barplot with Q1 and Q4 colors
+    ax = sns.barplot(
+        data=yearly_data,
+        x='ProductName',
+        y='Profit',
+        hue='Quarter',
+        dodge=True,
+        palette={first: 'blue', second: 'orange'}
+    )
+
+    plt.title(f'Top 3 Most Profitable Products: {first} vs {second} in {int(year)}')
+    plt.xlabel('Product Name')
+    plt.ylabel('Profit (USD)')
+    plt.legend(title='Quarter', loc='upper right')
+    plt.xticks(rotation=45, ha='right')
+    plt.grid(axis='y')
+
+    # Annotate bars with discount info
+    for bar, (_, row) in zip(ax.patches, yearly_data.iterrows()):
+        discount_text = 'Discount' if row['Discounted'] else 'No Discount'
+        plt.text(
+            bar.get_x() + bar.get_width() / 2,
+            bar.get_height(),
+            discount_text,
+            ha='center', va='bottom', fontsize=9, color='black'
+        )
+
+    plt.tight_layout()
+
+
+# Q1 and Q4 quantity bars for one year; rows carry a Quarter column
+def q1_q4_quantity(yearly_data, year, quarters=("Q1", "Q4")):
+    first, second = quarters
+    q1_year_data = yearly_data[yearly_data['Quarter'] == first]
+    q4_year_data = yearly_data[yearly_data['Quarter'] == second]
+
+    fig, ax1 = plt.subplots(figsize=(12, 8))
+    sns.barplot(
+        data=q1_year_data,
+        x='ProductName',
+        y='Quantity',
+        color='blue',
+        label=first
+    )
+    sns.barplot(
+        data=q4_year_data,
+        x='ProductName',
+        y='Quantity',
+        color='orange',
+        label=second
+    )
+
+    plt.title(f'Top 3 Most Bought Products: {first} vs {second} in {year}')
+    plt.xlabel('Product Name')
+    plt.ylabel('Quantity Sold')
+    plt.xticks(rotation=45, ha='right')
+    plt.legend()
+    plt.tight_layout()
+
+
+# Plain ranked bar chart (top products per year, top states)
+def ranked_bar(data, x, y, palette, title, xlabel, ylabel, rotate_labels=False):
+    plt.figure(figsize=(12, 8))
+    sns.barplot(
+        data=data,
+        x=x,
+        y=y,
+        palette=palette
+    )
+    plt.title(title)
+    plt.xlabel(xlabel)
+    plt.ylabel(ylabel)
+    if rotate_labels:
+        plt.xticks(rotation=45, ha='right')
+    plt.tight_layout()
+
+
+def combined_states(top_states_combined):
+    plt.figure(figsize=(12, 8))
+    sns.barplot(
+        data=top_states_combined,
+        x='State',
+        y='Profit',
+        hue='Metric',
+        palette={'Profit': 'purple', 'Efficiency': 'orange'}
+    )
+    plt.title('Combined Top States by Profit and Efficiency')
+    plt.xlabel('State')
+    plt.ylabel('Value')
+    plt.legend(title='Metric')
+    plt.tight_layout()
+
+
+# Profit bars with quantity on a twin axis for one state's top products
+def state_products(top_5_combined, state):
+    plt.figure(figsize=(12, 8))
+    ax = sns.barplot(
+        data=top_5_combined,
+        x='ProductName',
+        y='Profit',
+        color='blue',
+        label='Profit'
+    )
+    ax2 = ax.twinx()
+    sns.lineplot(
+        data=top_5_combined,
+        x='ProductName',
+        y='Quantity',
+        color='green',
+        marker='o',
+        ax=ax2,
+        label='Quantity'
+    )
+    ax.set_ylabel('Profit (USD)')
+    ax2.set_ylabel('Quantity Sold')
+    plt.title(f'Top 5 Products by Profit and Quantity in {state}')
+    ax.set_xlabel('Product Name')
+    ax.set_xticklabels(top_5_combined['ProductName'], rotation=45, ha='right')
+    ax.legend(loc='upper left')
+    ax2.legend(loc='upper right')
+    plt.tight_layout()
+
+
+# Cohort x months-since-first-order retention heatmap
+def cohort_retention(retention):
+    plt.figure(figsize=(14, 10))
+    sns.heatmap(retention, cmap='YlGnBu', vmin=0, vmax=retention.iloc[:, 1:].max().max(), cbar_kws={'label': 'Share of Cohort'})
+    plt.title('Monthly Cohort Retention')
+    plt.xlabel('Months Since First Order')
+    plt.ylabel('Acquisition Cohort')
+    plt.tight_layout()
+
+
+chart_kinds = {
+    "monthly_trends": monthly_trends,
+    "region_profit": region_profit,
+    "dip_periods": dip_periods,
+    "product_trends": product_trends,
+    "q1_q4_discounts": q1_q4_discounts,
+    "q1_q4_quantity": q1_q4_quantity,
+    "ranked_bar": ranked_bar,
+    "combined_states": combined_states,
+    "state_products": state_products,
+    "cohort_retention": cohort_retention,
+}
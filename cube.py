@@ -0,0 +1,151 @@
+import numpy as np
+import pandas as pd
+
+from currency import rates_for
+
+# Finest grain every report rolls up from
+cube_keys = ["Month", "ProductKey", "StoreKey"]
+
+
+# Dimension lookups, indexed by the surrogate key the cube carries
+def build_dimensions(product_data, stores_data):
+    return {
+        "ProductKey": product_data.set_index("ProductKey"),
+        "StoreKey": stores_data.set_index("StoreKey"),
+    }
+
+
+# One pass over the order lines: Quantity and line count per (Month, ProductKey, StoreKey,
+# Currency_Code). The cube holds only keys, date parts and measures; names and sizes stay in
+# the dimensions. Lines without a date, product or store are left out; lines without a
+# currency are kept in a null Currency_Code cell. With a rate table, cells also carry
+# LocalQuantity, the quantity weighted by each line's exchange rate on its order date.
+def build_cube(sales_data, product_data, rate_table=None):
+    order_date = pd.to_datetime(sales_data["Order_Date"], errors="coerce")
+    month = order_date.dt.to_period("M").dt.to_timestamp()
+    # A missing quantity adds nothing to the sums, as it did when summed row by row
+    quantity = sales_data["Quantity"].fillna(0).astype("int32")
+    keys = list(cube_keys)
+    columns = {"Month": month, "Quantity": quantity}
+    aggregations = {"Quantity": ("Quantity", "sum"), "Lines": ("Quantity", "size")}
+    if "Currency_Code" in sales_data.columns:
+        keys.append("Currency_Code")
+    local = rate_table is not None and "Currency_Code" in keys
+    if local:
+        columns["LocalQuantity"] = quantity * rates_for(rate_table, order_date, sales_data["Currency_Code"])
+        aggregations["LocalQuantity"] = ("LocalQuantity", "sum")
+
+    complete = (month.notna() & sales_data["ProductKey"].notna() & sales_data["StoreKey"].notna()).to_numpy()
+    cube = (
+        sales_data[[key for key in keys if key != "Month"]]
+        .assign(**columns)[complete]
+        .groupby(keys, observed=True, dropna=False)
+        .agg(**aggregations)
+        .reset_index()
+    )
+    cube = cube.astype({"ProductKey": "int32", "StoreKey": "int32", "Lines": "int32"})
+
+    # Prices are fixed per product, so Revenue and Profit can be priced at cube level
+    products = product_data.set_index("ProductKey")
+    price = cube["ProductKey"].map(products["Unit_Price_USD"])
+    margin = cube["ProductKey"].map(products["revenue_per_unit"])
+    cube["Revenue"] = cube["Quantity"] * price
+    cube["Profit"] = cube["Quantity"] * margin
+    if local:
+        # Revenue and Profit in the currency each order was placed in
+        cube["Revenue_Local"] = cube["LocalQuantity"] * price
+        cube["Profit_Local"] = cube["LocalQuantity"] * margin
+
+    # Date parts are derived once, here, from the month
+    cube["Year"] = cube["Month"].dt.year.astype("int16")
+    cube["Quarter"] = cube["Month"].dt.quarter.astype("int8")
+    print(f"Built sales cube with {cube.shape[0]} cells from {sales_data.shape[0]} order lines")
+    return cube
+
+
+# Sum metrics by cube columns and/or dimension attributes (ProductName, State, ...).
+# Attributes are resolved by first aggregating on their surrogate key, then joining the
+# lookup onto that much smaller frame and aggregating once more.
+def roll_up(cube, by, metrics=("Quantity", "Revenue", "Profit"), dimensions=None):
+    by = [by] if isinstance(by, str) else list(by)
+    metrics = list(metrics)
+    keys = []
+    for column in by:
+        if column not in cube.columns:
+            column = next(key for key, lookup in (dimensions or {}).items() if column in lookup.columns)
+        if column not in keys:
+            keys.append(column)
+
+    aggregate = cube.groupby(keys, observed=True)[metrics].sum().reset_index()
+    if keys == by:
+        return aggregate
+    for key, lookup in dimensions.items():
+        attributes = [column for column in by if column in lookup.columns]
+        if key in keys and attributes:
+            aggregate = aggregate.join(lookup[attributes], on=key)
+    return aggregate.groupby(by, observed=True)[metrics].sum().reset_index()
+
+
+# Per-order-line average of a dimension attribute, recovered from the Lines count in each cell
+def line_mean(cube, by, column, dimensions):
+    by = [by] if isinstance(by, str) else list(by)
+    key = next(key for key, lookup in dimensions.items() if column in lookup.columns)
+    lines = roll_up(cube, [key], ["Lines"])
+    lines = lines.join(dimensions[key][[column] + [name for name in by if name not in lines.columns]], on=key)
+    grouped = lines.assign(_weighted=lines[column] * lines["Lines"]).groupby(by, observed=True)
+    return grouped["_weighted"].sum() / grouped["Lines"].sum()
+
+
+# Top k rows per group for several metrics at once, ordered by group then metric descending.
+# Rows are laid out group by group once; each metric then finds every group's k-th best value
+# with k passes of per-group maxima over that flat array, so cost and memory stay linear in
+# the rows and only the winners of each group are ever sorted. k may be a list: every k is a
+# prefix of the largest. Returns {(metric, k): frame}; NaN metrics rank last, like sort_values.
+def top_k(data, by, metrics, k):
+    by = [by] if isinstance(by, str) else list(by)
+    metrics = [metrics] if isinstance(metrics, str) else list(metrics)
+    ks = [k] if isinstance(k, int) else sorted(set(k))
+    # Rows with a missing group key are dropped, as groupby().head() does
+    if by:
+        codes = data.groupby(by, sort=True, observed=True).ngroup().fillna(-1).to_numpy(dtype="int64")
+    else:
+        codes = np.zeros(len(data), dtype="int64")
+    members = np.flatnonzero(codes >= 0)
+    order = members[np.argsort(codes[members], kind="stable")]
+    group = codes[order]
+    sizes = np.bincount(group)
+    starts = np.r_[0, np.cumsum(sizes)[:-1]]
+    keep = min(max(ks), int(sizes.max()) if len(sizes) else 0)
+
+    results = {}
+    for metric in metrics:
+        if keep == 0:
+            results.update({(metric, size): data.iloc[:0].reset_index(drop=True) for size in ks})
+            continue
+        values = np.nan_to_num(data[metric].to_numpy(dtype="float64")[order], nan=-np.inf, posinf=np.finfo("float64").max)
+
+        # Each pass takes the groups' largest remaining value and its ties; a group's k-th best
+        # is the value at which its running count reaches k (-inf once only NaNs remain)
+        threshold = np.full(len(sizes), -np.inf)
+        needed = np.full(len(sizes), keep)
+        remaining = values.copy()
+        for _ in range(keep):
+            largest = np.maximum.reduceat(remaining, starts)
+            ties = remaining == largest[group]
+            found = np.add.reduceat(ties, starts)
+            reached = (needed > 0) & (found >= needed) & (largest > -np.inf)
+            threshold[reached] = largest[reached]
+            needed = np.where(largest > -np.inf, needed - found, 0)
+            if not needed.any():
+                break
+            remaining[ties] = -np.inf
+
+        # Only rows at or above their group's threshold are sorted: metric descending, then
+        # original position, so ties resolve the way a stable sort_values would
+        candidates = np.flatnonzero(values >= threshold[group])
+        ordering = np.lexsort((order[candidates], -values[candidates], group[candidates]))
+        candidates = candidates[ordering]
+        rank = np.arange(len(candidates)) - np.searchsorted(group[candidates], group[candidates])
+        for size in ks:
+            results[(metric, size)] = data.iloc[order[candidates[rank < size]]].reset_index(drop=True)
+    return results
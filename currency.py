@@ -0,0 +1,36 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Exchange rates (units of currency per USD) as a dense currency x day matrix starting at start
+RateTable = namedtuple("RateTable", ["start", "currencies", "rates"])
+
+day = np.timedelta64(1, "D")
+
+
+# Build the matrix once; days without a quote carry the previous rate forward (as-of semantics)
+def build_rate_table(exchange_rates_data):
+    dates = pd.to_datetime(exchange_rates_data["Date"]).to_numpy("datetime64[D]")
+    start = dates.min()
+    days = int((dates.max() - start) / day) + 1
+    currencies = pd.Index(sorted(exchange_rates_data["Currency"].astype(str).unique()))
+
+    rates = np.full((len(currencies), days), np.nan)
+    codes = currencies.get_indexer(exchange_rates_data["Currency"].astype(str))
+    rates[codes, ((dates - start) / day).astype(np.int64)] = exchange_rates_data["Exchange"].to_numpy(dtype="float64")
+    rates = pd.DataFrame(rates.T).ffill().to_numpy().T
+    return RateTable(start, currencies, rates)
+
+
+# Rate in force on each date for each currency: two integer index arrays and one gather, O(n).
+# Dates after the last quote use the last rate; dates before the first one, or unknown currencies, get NaN.
+def rates_for(rate_table, dates, currencies):
+    offsets = ((pd.to_datetime(dates).to_numpy("datetime64[D]") - rate_table.start) / day)
+    offsets = np.nan_to_num(offsets, nan=-1).astype(np.int64)
+    codes = rate_table.currencies.get_indexer(pd.Series(currencies).astype(str))
+    valid = (offsets >= 0) & (codes >= 0)
+    result = np.full(len(offsets), np.nan)
+    days = rate_table.rates.shape[1]
+    result[valid] = rate_table.rates[codes[valid], np.minimum(offsets[valid], days - 1)]
+    return result
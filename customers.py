@@ -0,0 +1,121 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Per-customer totals plus the distinct (customer, month) pairs each customer bought in
+CustomerSummary = namedtuple("CustomerSummary", ["customers", "activity"])
+
+age_bands = [0, 25, 35, 45, 55, 65, np.inf]
+age_band_labels = ["<25", "25-34", "35-44", "45-54", "55-64", "65+"]
+
+
+# Months as a single integer (year * 12 + month - 1), so cohort offsets are plain subtraction
+def month_number(dates):
+    dates = pd.DatetimeIndex(dates)
+    return (dates.year * 12 + dates.month - 1).to_numpy(dtype="int32")
+
+
+def month_start(numbers):
+    numbers = np.asarray(numbers)
+    return pd.to_datetime({"year": numbers // 12, "month": numbers % 12 + 1, "day": 1})
+
+
+def empty_summary():
+    customers = pd.DataFrame({
+        "CustomerKey": np.zeros(0, dtype="int64"),
+        "First_Order": pd.to_datetime(np.zeros(0, dtype="int64"), unit="D"),
+        "Last_Order": pd.to_datetime(np.zeros(0, dtype="int64"), unit="D"),
+        "Orders": np.zeros(0, dtype="int32"),
+        "Revenue": np.zeros(0),
+    })
+    return CustomerSummary(customers, pd.DataFrame({"CustomerKey": np.zeros(0, dtype="int64"), "Month": np.zeros(0, dtype="int32")}))
+
+
+# One vectorized pass over a chunk of order lines: sort by (CustomerKey, Order_Number),
+# find the run boundaries, and reduce each run with ufunc.reduceat
+def summarize(sales_data, product_data):
+    sales_data = sales_data.dropna(subset=["CustomerKey", "Order_Date"])
+    # reduceat needs at least one run, and a filtered slice may have no order lines at all
+    if sales_data.empty:
+        return empty_summary()
+    customer = sales_data["CustomerKey"].to_numpy(dtype="int64")
+    order = sales_data["Order_Number"].to_numpy(dtype="int64")
+    order_date = pd.to_datetime(sales_data["Order_Date"]).to_numpy("datetime64[D]").astype("int64")
+    price = sales_data["ProductKey"].map(product_data.set_index("ProductKey")["Unit_Price_USD"])
+    revenue = sales_data["Quantity"].fillna(0).to_numpy(dtype="float64") * price.fillna(0).to_numpy(dtype="float64")
+
+    ordering = np.lexsort((order, customer))
+    customer, order, order_date, revenue = customer[ordering], order[ordering], order_date[ordering], revenue[ordering]
+
+    new_customer = np.r_[True, customer[1:] != customer[:-1]]
+    new_order = new_customer | np.r_[True, order[1:] != order[:-1]]
+    starts = np.flatnonzero(new_customer)
+    customers = pd.DataFrame({
+        "CustomerKey": customer[starts],
+        "First_Order": pd.to_datetime(np.minimum.reduceat(order_date, starts), unit="D"),
+        "Last_Order": pd.to_datetime(np.maximum.reduceat(order_date, starts), unit="D"),
+        "Orders": np.add.reduceat(new_order.astype("int32"), starts),
+        "Revenue": np.add.reduceat(revenue, starts),
+    })
+
+    month = month_number(order_date.astype("datetime64[D]"))
+    new_month = new_customer | np.r_[True, month[1:] != month[:-1]]
+    activity = pd.DataFrame({"CustomerKey": customer, "Month": month})
+    # Months are not sorted within a customer, so a run check only thins the pairs out before de-duplicating
+    activity = activity[new_month].drop_duplicates(ignore_index=True)
+    return CustomerSummary(customers, activity)
+
+
+# Quintile scores, 5 = best; ties share the same rank
+def quintile(values, ascending=True):
+    ranks = pd.Series(values).rank(method="average", pct=True, ascending=ascending)
+    return np.ceil(ranks * 5).clip(1, 5).astype("int8").to_numpy()
+
+
+# Recency (days before the day after the last order in the data), frequency and monetary value
+def rfm_scores(customers):
+    as_of = customers["Last_Order"].max() + pd.Timedelta(days=1)
+    rfm = customers[["CustomerKey"]].copy()
+    rfm["Recency"] = (as_of - customers["Last_Order"]).dt.days.astype("int32")
+    rfm["Frequency"] = customers["Orders"]
+    rfm["Monetary"] = customers["Revenue"]
+    rfm["R"] = quintile(rfm["Recency"], ascending=False)
+    rfm["F"] = quintile(rfm["Frequency"])
+    rfm["M"] = quintile(rfm["Monetary"])
+    rfm["RFM_Score"] = rfm["R"] + rfm["F"] + rfm["M"]
+    rfm["RFM_Segment"] = rfm["R"].astype(str) + rfm["F"].astype(str) + rfm["M"].astype(str)
+    return rfm
+
+
+# Share of each monthly acquisition cohort still buying N months after its first order
+def cohort_retention(summary):
+    first_month = month_number(summary.customers["First_Order"])
+    cohort = pd.Series(first_month, index=summary.customers["CustomerKey"])
+    activity = summary.activity
+    cohorts = cohort.reindex(activity["CustomerKey"]).to_numpy()
+    offsets = activity["Month"].to_numpy() - cohorts
+
+    active = pd.DataFrame({"Cohort": cohorts, "Offset": offsets}).groupby(["Cohort", "Offset"]).size()
+    counts = active.unstack(fill_value=0)
+    retention = counts.div(cohort.value_counts().reindex(counts.index), axis=0)
+    retention.index = month_start(retention.index).dt.to_period("M")
+    retention.index.name = "Cohort"
+    return retention
+
+
+# Revenue per age band, with ages taken at the last order date in the data
+def age_band_revenue(customers, customer_data):
+    as_of = customers["Last_Order"].max()
+    birthdays = pd.to_datetime(customer_data.set_index("CustomerKey")["Birthday"], errors="coerce")
+    birthdays = birthdays.reindex(customers["CustomerKey"])
+    age = ((as_of - birthdays).dt.days / 365.25).to_numpy()
+    bands = pd.cut(age, age_bands, right=False, labels=age_band_labels)
+    by_band = pd.DataFrame({"Age_Band": bands, "Revenue": customers["Revenue"].to_numpy(), "Orders": customers["Orders"].to_numpy()})
+    by_band = by_band.groupby("Age_Band", observed=False).agg(
+        Customers=("Revenue", "size"),
+        Orders=("Orders", "sum"),
+        Revenue=("Revenue", "sum"),
+    ).reset_index()
+    by_band["Revenue_Per_Customer"] = by_band["Revenue"] / by_band["Customers"]
+    return by_band
@@ -0,0 +1,68 @@
+import hashlib
+import json
+import os
+import time
+
+import pandas as pd
+
+# Local columnar cache for source tables
+cache_dir = os.environ.get("SALES_CACHE_DIR", "cache")
+
+
+# Build a stable key from everything that shapes the query result
+def cache_key(table_name, columns="*", where_clause=None):
+    raw = json.dumps([table_name, " ".join(columns.split()), where_clause])
+    return f"{table_name}_{hashlib.sha1(raw.encode()).hexdigest()[:16]}"
+
+
+def cache_paths(table_name, columns="*", where_clause=None):
+    key = cache_key(table_name, columns, where_clause)
+    return os.path.join(cache_dir, f"{key}.parquet"), os.path.join(cache_dir, f"{key}.json")
+
+
+# Return the cached frame, or None if it is missing, too old or behind the watermark
+def read_cache(table_name, columns="*", where_clause=None, max_age=None, watermark=None):
+    data_path, meta_path = cache_paths(table_name, columns, where_clause)
+    if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if max_age is not None and time.time() - meta["created_at"] > max_age:
+        return None
+    if watermark is not None and meta.get("watermark") != str(watermark):
+        return None
+    return pd.read_parquet(data_path)
+
+
+def write_cache(data, table_name, columns="*", where_clause=None, watermark=None):
+    os.makedirs(cache_dir, exist_ok=True)
+    data_path, _ = cache_paths(table_name, columns, where_clause)
+    # Write to a temp file first so a crashed run never leaves a half-written table
+    tmp_path = data_path + ".tmp"
+    data.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, data_path)
+    write_meta(data.shape[0], table_name, columns, where_clause, watermark=watermark)
+
+
+# Record the sidecar for a Parquet file that is already in place (e.g. written in chunks)
+def write_meta(rows, table_name, columns="*", where_clause=None, watermark=None):
+    _, meta_path = cache_paths(table_name, columns, where_clause)
+    meta = {
+        "table": table_name,
+        "columns": columns,
+        "where_clause": where_clause,
+        "rows": int(rows),
+        "created_at": time.time(),
+        "watermark": None if watermark is None else str(watermark),
+    }
+    with open(meta_path, "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+# Drop cached tables, either one table or everything
+def clear_cache(table_name=None):
+    if not os.path.isdir(cache_dir):
+        return
+    for name in os.listdir(cache_dir):
+        if table_name is None or name.startswith(f"{table_name}_"):
+            os.remove(os.path.join(cache_dir, name))
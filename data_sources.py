@@ -0,0 +1,199 @@
+import os
+import threading
+import urllib.parse
+
+import pandas as pd
+from sqlalchemy import create_engine
+
+import data_cache
+from data_cache import cache_paths, read_cache, write_cache, write_meta
+from ingest import (
+    downcast_chunk, fact_watermarks, load_incremental, refresh_dimension, store_files, stream_to_parquet,
+    sync_incremental, table_fingerprint,
+)
+
+
+def parse_columns(columns):
+    if columns.strip() == "*":
+        return None
+    return [column.strip() for column in columns.split(",")]
+
+
+def sql_connection_string(server, database, username, password):
+    return (
+        "mssql+pyodbc:///?odbc_connect=" +
+        urllib.parse.quote_plus(
+            f"DRIVER={{ODBC Driver 18 for SQL Server}};"
+            f"SERVER={server};DATABASE={database};"
+            f"UID={username};PWD={password};"
+            "TrustServerCertificate=yes"
+        )
+    )
+
+
+# SQL Server backend: cached fetches, incremental sales and change-detected dimensions
+class SqlSource:
+    # Sales is appended to incrementally, products and stores only reload when they change
+    incremental_tables = {"proj_sales"}
+    dimension_tables = {"proj_products", "proj_stores"}
+    watermark_queries = {
+        "proj_sales": "SELECT COUNT(*), MAX(Order_Number) FROM proj_sales",
+    }
+
+    def __init__(self, connection_string, pool_size=5, cache_max_age=None):
+        self.connection_string = connection_string
+        self.pool_size = pool_size
+        self.cache_max_age = cache_max_age
+        self._engine = None
+        self._engine_lock = threading.Lock()
+
+    # Created on first use, so building a source never connects or loads the ODBC driver
+    @property
+    def engine(self):
+        with self._engine_lock:
+            if self._engine is None:
+                # One pooled connection per table so they can load concurrently
+                self._engine = create_engine(self.connection_string, pool_size=self.pool_size, max_overflow=self.pool_size, pool_pre_ping=True)
+            return self._engine
+
+    # Cheap query whose result changes whenever the table does: the watermark query for
+    # append-only tables, row count and checksum of the columns for the rest
+    def fetch_watermark(self, table_name, columns="*"):
+        query = self.watermark_queries.get(table_name)
+        if not query:
+            return tuple(table_fingerprint(self.engine, table_name, columns))
+        with self.engine.connect() as conn:
+            return tuple(conn.exec_driver_sql(query).fetchone())
+
+    def fetch_data(self, table_name, columns="*", where_clause=None, use_cache=True, chunksize=None):
+        watermark = self.fetch_watermark(table_name, columns) if use_cache else None
+        if use_cache:
+            data = read_cache(table_name, columns, where_clause, max_age=self.cache_max_age, watermark=watermark)
+            if data is not None:
+                print(f"Loaded {table_name} from cache with {data.shape[0]} rows and {data.shape[1]} columns")
+                return data
+        query = f"SELECT {columns} FROM {table_name}"
+        if where_clause:
+            query += f" WHERE {where_clause}"
+        # Streaming mode: chunks are downcast and written to the columnar cache as they arrive
+        if chunksize:
+            os.makedirs(data_cache.cache_dir, exist_ok=True)
+            data_path, _ = cache_paths(table_name, columns, where_clause)
+            rows, _ = stream_to_parquet(self.engine, query, data_path, chunksize=chunksize)
+            # No file was written, so any older one at data_path must not be stamped as current
+            if not rows:
+                data = downcast_chunk(pd.DataFrame(columns=parse_columns(columns) or []), categorize=False)
+                print(f"Streamed {table_name} with 0 rows and {data.shape[1]} columns")
+                return data
+            write_meta(rows, table_name, columns, where_clause, watermark=watermark)
+            data = pd.read_parquet(data_path)
+            print(f"Streamed {table_name} with {data.shape[0]} rows and {data.shape[1]} columns")
+            return data
+        try:
+            data = pd.read_sql(query, self.engine)
+            print(f"Loaded {table_name} with {data.shape[0]} rows and {data.shape[1]} columns")
+            if use_cache:
+                write_cache(data, table_name, columns, where_clause, watermark=watermark)
+            return data
+        except Exception as e:
+            print(f"Error loading {table_name}: {e}")
+
+    # Changes whenever any of the tables ({table_name: columns}) does
+    def data_version(self, tables):
+        return tuple(self.fetch_watermark(table_name, columns) for table_name, columns in tables.items())
+
+    # Parquet files holding the table, brought up to date first (for out-of-core engines)
+    def parquet_files(self, table_name, columns):
+        if table_name in self.incremental_tables:
+            sync_incremental(self.engine, table_name, columns)
+            return store_files(table_name)
+        if table_name in self.dimension_tables:
+            refresh_dimension(self.engine, table_name, columns)
+            return store_files(table_name)
+        self.fetch_data(table_name, columns=columns)
+        return [cache_paths(table_name, columns)[0]]
+
+    def load(self, table_name, columns):
+        if table_name in self.incremental_tables:
+            return load_incremental(self.engine, table_name, columns)
+        if table_name in self.dimension_tables:
+            return refresh_dimension(self.engine, table_name, columns)
+        return self.fetch_data(table_name, columns=columns)
+
+
+# Modification time and size of each file, None for missing ones
+def file_version(paths):
+    version = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            version.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            version.append(None)
+    return tuple(version)
+
+
+# Parquet backend: one {table_name}.parquet file per table
+class ParquetSource:
+    pool_size = 5
+
+    def __init__(self, parquet_dir):
+        self.parquet_dir = parquet_dir
+
+    def path(self, table_name):
+        return os.path.join(self.parquet_dir, f"{table_name}.parquet")
+
+    def data_version(self, tables):
+        return file_version(self.path(table_name) for table_name in tables)
+
+    def parquet_files(self, table_name, columns):
+        return [self.path(table_name)]
+
+    def load(self, table_name, columns):
+        data = pd.read_parquet(self.path(table_name), columns=parse_columns(columns))
+        print(f"Loaded {table_name} with {data.shape[0]} rows and {data.shape[1]} columns")
+        return data
+
+
+# Excel backend: each workbook is parsed once and kept as typed Parquet until it changes
+class ExcelSource(ParquetSource):
+    def __init__(self, data_dir="data", parquet_dir=None):
+        super().__init__(parquet_dir or os.path.join(data_cache.cache_dir, "excel"))
+        self.data_dir = data_dir
+
+    def convert(self, table_name):
+        workbook = os.path.join(self.data_dir, f"{table_name}.xlsx")
+        path = self.path(table_name)
+        if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(workbook):
+            return
+        os.makedirs(self.parquet_dir, exist_ok=True)
+        # Only the fact table gets categorical strings; dimension names stay plain for plotting
+        data = downcast_chunk(pd.read_excel(workbook), categorize=table_name in fact_watermarks)
+        data.to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+        print(f"Converted {workbook} to {path}")
+
+    def data_version(self, tables):
+        return file_version(os.path.join(self.data_dir, f"{table_name}.xlsx") for table_name in tables)
+
+    def parquet_files(self, table_name, columns):
+        self.convert(table_name)
+        return super().parquet_files(table_name, columns)
+
+    def load(self, table_name, columns):
+        self.convert(table_name)
+        return super().load(table_name, columns)
+
+
+def make_source(kind, **options):
+    if kind == "sql":
+        return SqlSource(
+            options["connection_string"],
+            pool_size=options.get("pool_size", 5),
+            cache_max_age=options.get("cache_max_age"),
+        )
+    if kind == "excel":
+        return ExcelSource(options.get("data_dir", "data"))
+    if kind == "parquet":
+        return ParquetSource(options["parquet_dir"])
+    raise ValueError(f"Unknown data source: {kind}")
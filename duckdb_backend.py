@@ -0,0 +1,173 @@
+import os
+
+import pandas as pd
+
+import data_cache
+import pipeline
+import reports
+from pushdown import cube_lines_filter, numeric
+
+# Out-of-core engine: the same aggregates as the pandas tasks, planned and run by DuckDB
+# directly over the Parquet files of the columnar store. DuckDB uses every core and spills
+# to temp_directory when an aggregate does not fit in memory_limit.
+
+# Order lines the sales cube keeps, picked by the same filter as the SQL pushdown queries
+cube_lines = f"""
+    SELECT date_trunc('month', CAST(s.Order_Date AS TIMESTAMP)) AS Month, s.ProductKey, s.StoreKey, s.Quantity
+    FROM sales s
+    WHERE {cube_lines_filter}
+"""
+
+# Quantity and line count per product and store, priced afterwards like the cube
+store_products = f"""
+    SELECT l.StoreKey, l.ProductKey, SUM(l.Quantity) AS Quantity, COUNT(*) AS Lines,
+           SUM(l.Quantity) * p.Unit_Price_USD AS Revenue,
+           SUM(l.Quantity) * (p.Unit_Price_USD - p.Unit_Cost_USD) AS Profit
+    FROM ({cube_lines}) l
+    LEFT JOIN products p ON p.ProductKey = l.ProductKey
+    GROUP BY l.StoreKey, l.ProductKey, p.Unit_Price_USD, p.Unit_Cost_USD
+"""
+
+monthly_sales_query = f"""
+    SELECT Month, SUM(Revenue) AS Revenue, SUM(Profit) AS Profit
+    FROM (
+        SELECT l.Month, SUM(l.Quantity) * p.Unit_Price_USD AS Revenue,
+               SUM(l.Quantity) * (p.Unit_Price_USD - p.Unit_Cost_USD) AS Profit
+        FROM ({cube_lines}) l
+        LEFT JOIN products p ON p.ProductKey = l.ProductKey
+        GROUP BY l.Month, l.ProductKey, p.Unit_Price_USD, p.Unit_Cost_USD
+    )
+    GROUP BY Month
+    ORDER BY Month
+"""
+
+region_revenue_query = f"""
+    SELECT st.State, st.Country, SUM(sp.Profit) AS Profit
+    FROM ({store_products}) sp
+    JOIN stores st ON st.StoreKey = sp.StoreKey
+    WHERE st.State IS NOT NULL AND st.Country IS NOT NULL
+    GROUP BY st.State, st.Country
+    ORDER BY Profit DESC, st.State, st.Country
+"""
+
+# StoreSize is summed per order line, as in the pandas report
+state_performance_query = f"""
+    SELECT st.State, SUM(sp.Profit) AS Profit, SUM(st.Square_Meters * sp.Lines) AS StoreSize
+    FROM ({store_products}) sp
+    JOIN stores st ON st.StoreKey = sp.StoreKey
+    WHERE st.State IS NOT NULL
+    GROUP BY st.State
+    ORDER BY st.State
+"""
+
+# Top products by profit per state; ties go to the first product name, as in cube.top_k
+top_products_top_states_query = f"""
+    SELECT State, ProductName, Profit, Quantity
+    FROM (
+        SELECT st.State, p.Product_Name AS ProductName, SUM(sp.Profit) AS Profit, SUM(sp.Quantity) AS Quantity,
+               ROW_NUMBER() OVER (PARTITION BY st.State ORDER BY SUM(sp.Profit) DESC NULLS LAST, p.Product_Name) AS Rank
+        FROM ({store_products}) sp
+        JOIN stores st ON st.StoreKey = sp.StoreKey
+        JOIN products p ON p.ProductKey = sp.ProductKey
+        WHERE st.State IN (SELECT unnest($states)) AND p.Product_Name IS NOT NULL
+        GROUP BY st.State, p.Product_Name
+    )
+    WHERE Rank <= $k
+    ORDER BY State, Rank
+"""
+
+
+def connect(source, memory_limit=None, threads=None):
+    import duckdb
+
+    temp_directory = os.path.join(data_cache.cache_dir, "duckdb")
+    os.makedirs(temp_directory, exist_ok=True)
+    config = {"temp_directory": temp_directory, "preserve_insertion_order": False}
+    if memory_limit:
+        config["memory_limit"] = memory_limit
+    if threads:
+        config["threads"] = threads
+    connection = duckdb.connect(config=config)
+    # Views only: nothing is read until a query needs it, and then only the columns it uses
+    for view, table_name in [("sales", "proj_sales"), ("products", "proj_products"), ("stores", "proj_stores")]:
+        files = source.parquet_files(table_name, reports.tables[table_name])
+        file_list = ", ".join("'" + path.replace("'", "''") + "'" for path in files)
+        connection.execute(f"CREATE VIEW {view} AS SELECT * FROM read_parquet([{file_list}], union_by_name = true)")
+    return connection
+
+
+def monthly_sales(connection, values):
+    data = connection.execute(monthly_sales_query).df()
+    data['Month'] = pd.to_datetime(data['Month'])
+    return numeric(data, ['Revenue', 'Profit'])
+
+
+def region_revenue(connection, values):
+    return numeric(connection.execute(region_revenue_query).df(), ['Profit'])
+
+
+def state_performance(connection, values):
+    data = numeric(connection.execute(state_performance_query).df(), ['Profit', 'StoreSize'])
+    data['Efficiency'] = data['Profit'] / data['StoreSize']
+    return data
+
+
+# Picks the top states with the pandas task, on the state_performance computed here
+def top_products_top_states(connection, values):
+    top_states = pipeline.run(["top_states_combined"], provided=values)["top_states_combined"]
+    data = connection.execute(top_products_top_states_query, {
+        "states": list(top_states['State']),
+        "k": values["report_settings"]["top_n"],
+    }).df()
+    # The dtype the pandas path returns
+    data['Quantity'] = data['Quantity'].astype("int32")
+    return numeric(data, ['Profit'])
+
+
+# Pipeline outputs this engine computes, in dependency order
+duckdb_tasks = {
+    "monthly_sales": monthly_sales,
+    "region_revenue": region_revenue,
+    "state_performance": state_performance,
+    "top_products_top_states": top_products_top_states,
+}
+
+
+# Compute the outputs the targets need; the results are fed to pipeline.run as provided
+# values, so the sales cube is only built in pandas if some other report still needs it
+def duckdb_values(source, targets, provided=(), memory_limit=None, threads=None):
+    needed = set(pipeline.resolve_order(targets, provided))
+    if not needed & set(duckdb_tasks):
+        return {}
+    connection = connect(source, memory_limit, threads)
+    values = {**pipeline.run(["report_settings"], provided=dict(provided)), **dict(provided)}
+    computed = {}
+    try:
+        for name, query in duckdb_tasks.items():
+            if name in needed:
+                # top_products_top_states needs state_performance, which may not be a target
+                if name == "top_products_top_states" and "state_performance" not in values:
+                    values["state_performance"] = state_performance(connection, values)
+                values[name] = computed[name] = query(connection, values)
+                print(f"DuckDB computed {name}: {computed[name].shape[0]} rows")
+    finally:
+        connection.close()
+    return computed
+
+
+# Compare every DuckDB result with the pandas path, which stays the correctness oracle
+def verify(source, provided):
+    expected = pipeline.run(list(duckdb_tasks), provided=provided)
+    actual = duckdb_values(source, list(duckdb_tasks), provided)
+    mismatches = []
+    for name in duckdb_tasks:
+        # Row order is compared, row labels are not: they come from the pandas groupby
+        left = expected[name].reset_index(drop=True)
+        right = actual[name][list(left.columns)].reset_index(drop=True)
+        try:
+            pd.testing.assert_frame_equal(left, right, check_dtype=False, rtol=1e-9)
+            print(f"DuckDB {name} matches pandas ({right.shape[0]} rows)")
+        except AssertionError as e:
+            print(f"DuckDB {name} differs from pandas: {e}")
+            mismatches.append(name)
+    return mismatches
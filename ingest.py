@@ -0,0 +1,263 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import text
+
+import data_cache
+import instrumentation
+
+# Append-only fact tables and the column used as their high-water mark
+fact_watermarks = {
+    "proj_sales": "Order_Number",
+}
+
+# Dimension tables are reloaded only when this fingerprint changes
+fingerprint_query = "SELECT COUNT_BIG(*), CHECKSUM_AGG(BINARY_CHECKSUM({columns})) FROM {table_name}"
+
+
+# Fixed narrow dtypes so every streamed chunk shares one Parquet schema; a column with
+# missing keys takes the nullable variant (Int32, Int16), which is stored the same way
+stream_dtypes = {
+    "Order_Number": "int32",
+    "Line_Item": "int16",
+    "CustomerKey": "int32",
+    "StoreKey": "int32",
+    "ProductKey": "int32",
+    "Quantity": "int16",
+}
+date_columns = {"Order_Date", "Delivery_Date", "Date", "Birthday", "Open_Date"}
+default_chunksize = 100_000
+
+
+def downcast_chunk(chunk, categorize=True):
+    for column in chunk.columns:
+        if column in stream_dtypes:
+            dtype = stream_dtypes[column]
+            chunk[column] = chunk[column].astype(dtype.capitalize() if chunk[column].isna().any() else dtype)
+        elif column in date_columns:
+            chunk[column] = pd.to_datetime(chunk[column], errors="coerce")
+        elif categorize and (chunk[column].dtype == object or pd.api.types.is_string_dtype(chunk[column])):
+            chunk[column] = chunk[column].astype("category")
+    return chunk
+
+
+# Dictionary indices vary with the categories seen in each chunk, so pin them to int32
+def stream_schema(table):
+    fields = []
+    for field in table.schema:
+        if pa.types.is_dictionary(field.type):
+            field = field.with_type(pa.dictionary(pa.int32(), field.type.value_type))
+        fields.append(field)
+    return pa.schema(fields)
+
+
+# Read a query through a server-side cursor chunk by chunk
+def stream_query(engine, query, params=None, chunksize=default_chunksize):
+    with engine.connect().execution_options(stream_results=True) as conn:
+        for chunk in pd.read_sql(text(query), conn, params=params or {}, chunksize=chunksize):
+            yield downcast_chunk(chunk)
+
+
+# Stream a query straight into one Parquet file; only one chunk is ever held in memory
+def stream_to_parquet(engine, query, path, params=None, chunksize=default_chunksize, track_max=None):
+    rows = 0
+    max_value = None
+    writer = None
+    tmp_path = path + ".tmp"
+    try:
+        for chunk in stream_query(engine, query, params, chunksize):
+            if chunk.empty:
+                continue
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                schema = stream_schema(table)
+                writer = pq.ParquetWriter(tmp_path, schema)
+            writer.write_table(table.cast(schema))
+            rows += chunk.shape[0]
+            if track_max:
+                chunk_max = chunk[track_max].max().item()
+                max_value = chunk_max if max_value is None else max(max_value, chunk_max)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is not None:
+        os.replace(tmp_path, path)
+    return rows, max_value
+
+
+def store_dir(table_name):
+    return os.path.join(data_cache.cache_dir, "store", table_name)
+
+
+def state_path():
+    return os.path.join(data_cache.cache_dir, "ingest_state.json")
+
+
+def load_state():
+    if not os.path.exists(state_path()):
+        return {}
+    with open(state_path()) as f:
+        return json.load(f)
+
+
+# Tables may be loaded from several threads, so state updates are read-modify-write under a lock
+state_lock = threading.Lock()
+
+
+def update_state(table_name, **values):
+    with state_lock:
+        state = load_state()
+        state.setdefault(table_name, {}).update(values)
+        save_state(state)
+
+
+def save_state(state):
+    os.makedirs(data_cache.cache_dir, exist_ok=True)
+    tmp_path = state_path() + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2, default=str)
+    os.replace(tmp_path, state_path())
+
+
+def store_files(table_name):
+    path = store_dir(table_name)
+    parts = sorted(name for name in os.listdir(path) if name.endswith(".parquet")) if os.path.isdir(path) else []
+    return [os.path.join(path, name) for name in parts]
+
+
+def read_store(table_name):
+    parts = store_files(table_name)
+    if not parts:
+        return None
+    return pd.read_parquet(parts)
+
+
+# Fact parts are named part-NNNNN-<high-water mark>.parquet, so the rename that adds a
+# part's rows records how far the store reaches in the same step
+def next_part_path(table_name, high_water=None):
+    path = store_dir(table_name)
+    os.makedirs(path, exist_ok=True)
+    part = len([name for name in os.listdir(path) if name.endswith(".parquet")])
+    suffix = "" if high_water is None else f"-{high_water}"
+    return os.path.join(path, f"part-{part:05d}{suffix}.parquet")
+
+
+def part_high_water(path):
+    fields = os.path.basename(path)[:-len(".parquet")].split("-", 2)
+    return int(fields[2]) if len(fields) == 3 else None
+
+
+# Write one new part file next to the existing ones
+def append_to_store(data, table_name):
+    part_path = next_part_path(table_name)
+    data.to_parquet(part_path + ".tmp", index=False)
+    os.replace(part_path + ".tmp", part_path)
+
+
+def clear_store(table_name):
+    path = store_dir(table_name)
+    if os.path.isdir(path):
+        for name in os.listdir(path):
+            os.remove(os.path.join(path, name))
+
+
+def replace_store(data, table_name):
+    clear_store(table_name)
+    append_to_store(data, table_name)
+
+
+# Fetch only fact rows past the stored high-water mark and append them locally
+def sync_incremental(engine, table_name, columns, chunksize=default_chunksize):
+    key_column = fact_watermarks[table_name]
+    table_state = load_state().get(table_name, {})
+    marks = [part_high_water(path) for path in store_files(table_name)]
+    high_water = max(marks) if marks and None not in marks else None
+
+    # A different column list cannot be appended to the existing parts, so start over. Stores
+    # written before the column list was recorded are treated as different too.
+    if marks and table_state.get("columns") != columns:
+        print(f"Column list for {table_name} changed, reloading it in full")
+        clear_store(table_name)
+        high_water = None
+    # Parts without a high-water mark in their name predate that layout
+    elif None in marks:
+        print(f"Local store for {table_name} has no high-water marks, reloading it in full")
+        clear_store(table_name)
+
+    query = f"SELECT {columns} FROM {table_name}"
+    params = {}
+    if high_water is not None:
+        query += f" WHERE {key_column} > :high_water"
+        params["high_water"] = high_water
+    query += f" ORDER BY {key_column}"
+    # Staged under a name read_store ignores until its high-water mark is known
+    staging_path = os.path.join(store_dir(table_name), "incoming")
+    os.makedirs(store_dir(table_name), exist_ok=True)
+    rows, new_high_water = stream_to_parquet(engine, query, staging_path, params, chunksize, track_max=key_column)
+    print(f"Fetched {rows} new rows from {table_name} (high-water mark {high_water})")
+
+    if rows:
+        os.replace(staging_path, next_part_path(table_name, new_high_water))
+        update_state(table_name, columns=columns)
+    return rows
+
+
+def load_incremental(engine, table_name, columns, chunksize=default_chunksize):
+    sync_incremental(engine, table_name, columns, chunksize)
+    data = read_store(table_name)
+    if data is None:
+        data = pd.DataFrame(columns=[column.strip() for column in columns.split(",")])
+    print(f"Loaded {table_name} with {data.shape[0]} rows and {data.shape[1]} columns")
+    return data
+
+
+def table_fingerprint(engine, table_name, columns):
+    query = fingerprint_query.format(table_name=table_name, columns=columns)
+    with engine.connect() as conn:
+        return [str(value) for value in conn.execute(text(query)).fetchone()]
+
+
+# Reload a dimension table only when its row count or checksum has moved
+def refresh_dimension(engine, table_name, columns):
+    stored_fingerprint = load_state().get(table_name, {}).get("fingerprint")
+    fingerprint = table_fingerprint(engine, table_name, columns)
+
+    data = read_store(table_name)
+    if data is not None and stored_fingerprint == fingerprint:
+        print(f"Loaded {table_name} from local store with {data.shape[0]} rows and {data.shape[1]} columns")
+        return data
+
+    data = pd.read_sql(text(f"SELECT {columns} FROM {table_name}"), engine)
+    replace_store(data, table_name)
+    update_state(table_name, fingerprint=fingerprint)
+    print(f"Refreshed {table_name} with {data.shape[0]} rows and {data.shape[1]} columns")
+    return data
+
+
+# Load several tables at once; each worker holds its own pooled connection
+def load_tables_parallel(tables, load_table, max_workers=None):
+    def timed_load(table_name, columns):
+        start = time.perf_counter()
+        with instrumentation.stage(f"load:{table_name}") as record:
+            data = load_table(table_name, columns)
+            record["rows"] = instrumentation.row_count(data)
+        return data, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers or len(tables)) as pool:
+        futures = {table: pool.submit(timed_load, table, columns) for table, columns in tables.items()}
+        results = {table: future.result() for table, future in futures.items()}
+    total = time.perf_counter() - start
+
+    data = {table: result[0] for table, result in results.items()}
+    timings = {table: result[1] for table, result in results.items()}
+    for table, seconds in sorted(timings.items(), key=lambda item: -item[1]):
+        print(f"  {table}: {seconds:.2f}s")
+    print(f"Loaded {len(tables)} tables in {total:.2f}s (slowest {max(timings.values()):.2f}s)")
+    return data, timings
@@ -0,0 +1,89 @@
+import contextlib
+import cProfile
+import csv
+import json
+import threading
+import time
+import tracemalloc
+
+# Per-stage measurements for the current run
+records = []
+local = threading.local()
+
+
+def start(track_memory=False):
+    records.clear()
+    if track_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def stop():
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+# Time a stage and, when tracemalloc is on, its peak memory above the level it started at.
+# The yielded dict can be filled in with extra fields such as rows. The traced peak is
+# process-wide, so only stages on the main thread measure it; stages running concurrently
+# in worker threads (the parallel table loads) count towards the main-thread stage around them.
+@contextlib.contextmanager
+def stage(name, **fields):
+    record = {"stage": name, **fields}
+    stack = local.__dict__.setdefault("stack", [])
+    tracing = tracemalloc.is_tracing() and threading.current_thread() is threading.main_thread()
+    if tracing:
+        current, peak = tracemalloc.get_traced_memory()
+        # Hand the peak seen so far to the enclosing stage before resetting it
+        if stack:
+            stack[-1]["_peak"] = max(stack[-1]["_peak"], peak)
+        tracemalloc.reset_peak()
+        record["_base"], record["_peak"] = current, current
+    stack.append(record)
+    started = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["seconds"] = round(time.perf_counter() - started, 6)
+        stack.pop()
+        if tracing and tracemalloc.is_tracing():
+            peak = max(record.pop("_peak"), tracemalloc.get_traced_memory()[1])
+            record["peak_mb"] = round((peak - record.pop("_base")) / 1e6, 3)
+            if stack:
+                stack[-1]["_peak"] = max(stack[-1]["_peak"], peak)
+        records.append(record)
+
+
+# Stages timed elsewhere (e.g. in worker processes) are added as-is
+def record(name, seconds, **fields):
+    records.append({"stage": name, "seconds": round(seconds, 6), **fields})
+
+
+def row_count(value):
+    shape = getattr(value, "shape", None)
+    return int(shape[0]) if shape else None
+
+
+def write_report(path):
+    if path.endswith(".csv"):
+        fields = []
+        for row in records:
+            fields.extend(field for field in row if field not in fields)
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(records)
+    else:
+        with open(path, "w") as f:
+            json.dump(records, f, indent=2, default=str)
+    print(f"Wrote run report with {len(records)} stages to {path}")
+
+
+# Run func under cProfile and dump stats for snakeviz/pstats. Every stage is a named Python
+# function (a task, a loader, a chart kind), so samplers like py-spy attribute time the same way.
+def profiled(func, path, *args, **kwargs):
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        profiler.dump_stats(path)
+        print(f"Wrote profile to {path}")
@@ -0,0 +1,173 @@
+import json
+import os
+import shutil
+
+import pandas as pd
+
+import data_cache
+from data_sources import file_version, parse_columns
+
+# Sales laid out as Year=YYYY/Quarter=Q/part-NNNNN.parquet, with per-partition row counts
+# and min/max statistics in _stats.json, so a Year or Quarter filtered load opens only the
+# partitions that can match. Lines without an Order_Date go to Year=none/Quarter=none.
+# The statistics also record which source files have been split up, so when the source
+# only gains files (new parts of the incremental store) just those lines are appended.
+stats_columns = ["Order_Date", "Order_Number", "ProductKey", "StoreKey", "CustomerKey"]
+
+
+def partition_root(table_name="proj_sales"):
+    return os.path.join(data_cache.cache_dir, "partitions", table_name)
+
+
+def stats_path(root):
+    return os.path.join(root, "_stats.json")
+
+
+def load_stats(root):
+    try:
+        with open(stats_path(root)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def save_stats(root, stats):
+    with open(stats_path(root) + ".tmp", "w") as f:
+        json.dump(stats, f, indent=2)
+    os.replace(stats_path(root) + ".tmp", stats_path(root))
+
+
+def json_value(value):
+    if pd.isna(value):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    return value.item() if hasattr(value, "item") else value
+
+
+# Smaller or larger of two recorded bounds; None means no value yet
+def merge_bound(left, right, pick):
+    values = [value for value in (left, right) if value is not None]
+    return pick(values) if values else None
+
+
+# {(year, quarter): lines} for a batch of order lines, None for a missing key
+def split(sales_data):
+    order_date = pd.to_datetime(sales_data["Order_Date"], errors="coerce")
+    year = order_date.dt.year.astype("Int16")
+    quarter = order_date.dt.quarter.astype("Int8")
+    for (part_year, part_quarter), part in sales_data.groupby([year, quarter], dropna=False, sort=True):
+        part_year = None if pd.isna(part_year) else int(part_year)
+        part_quarter = None if pd.isna(part_quarter) else int(part_quarter)
+        yield (part_year, part_quarter), part
+
+
+def partition_dir(year, quarter):
+    return os.path.join(f"Year={year if year is not None else 'none'}", f"Quarter={quarter if quarter is not None else 'none'}")
+
+
+# Write each Year/Quarter slice of the lines as a new file of its partition and fold it into the statistics
+def add_lines(sales_data, root, stats):
+    partitions = {(partition["Year"], partition["Quarter"]): partition for partition in stats["partitions"]}
+    for key, part in split(sales_data):
+        partition = partitions.get(key)
+        if partition is None:
+            partition = partitions[key] = {"Year": key[0], "Quarter": key[1], "files": [], "rows": 0, "min": {}, "max": {}}
+        # Named from the statistics, so a file left by an interrupted append is simply overwritten
+        path = os.path.join(partition_dir(*key), f"part-{len(partition['files']):05d}.parquet")
+        os.makedirs(os.path.join(root, partition_dir(*key)), exist_ok=True)
+        part.to_parquet(os.path.join(root, path) + ".tmp", index=False)
+        os.replace(os.path.join(root, path) + ".tmp", os.path.join(root, path))
+        partition["files"].append(path)
+        partition["rows"] += int(part.shape[0])
+        for column in stats_columns:
+            if column in part.columns:
+                partition["min"][column] = merge_bound(partition["min"].get(column), json_value(part[column].min()), min)
+                partition["max"][column] = merge_bound(partition["max"].get(column), json_value(part[column].max()), max)
+    stats["partitions"] = [partitions[key] for key in sorted(partitions, key=lambda key: (key[0] is None, key))]
+    return stats
+
+
+# Split every source file into fresh partitions, built aside and swapped in whole
+def write_partitions(files, root, columns):
+    sales_data = pd.read_parquet(files, columns=parse_columns(columns))
+    tmp_root = root + ".tmp"
+    shutil.rmtree(tmp_root, ignore_errors=True)
+    os.makedirs(tmp_root)
+    stats = add_lines(sales_data, tmp_root, {"columns": columns, "sources": {}, "partitions": []})
+    stats["sources"] = source_versions(files)
+    save_stats(tmp_root, stats)
+    shutil.rmtree(root, ignore_errors=True)
+    os.makedirs(os.path.dirname(root), exist_ok=True)
+    os.replace(tmp_root, root)
+    print(f"Partitioned {sales_data.shape[0]} order lines into {len(stats['partitions'])} Year/Quarter partitions")
+    return stats
+
+
+def source_versions(files):
+    return {path: list(version) for path, version in zip(files, file_version(files))}
+
+
+# Bring the partitions up to date with the source's Parquet files: append the lines of files
+# that are new, and rebuild only if a file already partitioned changed or went away
+def ensure_partitions(source, columns, table_name="proj_sales"):
+    root = partition_root(table_name)
+    files = list(source.parquet_files(table_name, columns))
+    versions = source_versions(files)
+    stats = load_stats(root)
+    if stats is None or stats["columns"] != columns or "sources" not in stats or any(versions.get(path) != version for path, version in stats["sources"].items()):
+        return write_partitions(files, root, columns)
+
+    new_files = [path for path in files if path not in stats["sources"]]
+    if new_files:
+        new_lines = pd.read_parquet(new_files, columns=parse_columns(columns))
+        stats = add_lines(new_lines, root, stats)
+        stats["sources"].update(source_versions(new_files))
+        save_stats(root, stats)
+        print(f"Appended {new_lines.shape[0]} order lines to the Year/Quarter partitions")
+    return stats
+
+
+# Partitions that can hold rows for the given years, quarters and inclusive date range,
+# decided from the partition keys and the Order_Date min/max alone
+def prune(stats, years=None, quarters=None, date_range=None):
+    selected = []
+    for partition in stats["partitions"]:
+        if years is not None and partition["Year"] not in years:
+            continue
+        if quarters is not None and partition["Quarter"] not in quarters:
+            continue
+        if date_range is not None:
+            low, high = partition["min"].get("Order_Date"), partition["max"].get("Order_Date")
+            start, end = date_range
+            if low is None or (end is not None and pd.Timestamp(low) > pd.Timestamp(end)):
+                continue
+            if start is not None and pd.Timestamp(high) < pd.Timestamp(start):
+                continue
+        selected.append(partition)
+    return selected
+
+
+# Read only the partitions a filtered report needs
+def load_partitions(source, columns, years=None, quarters=None, date_range=None, table_name="proj_sales"):
+    stats = ensure_partitions(source, columns, table_name)
+    selected = prune(stats, years, quarters, date_range)
+    root = partition_root(table_name)
+    total = sum(partition["rows"] for partition in stats["partitions"])
+    rows = sum(partition["rows"] for partition in selected)
+    print(f"Reading {len(selected)} of {len(stats['partitions'])} partitions ({rows} of {total} order lines)")
+    if not selected:
+        return pd.DataFrame(columns=parse_columns(columns))
+    # One file at a time, as reading the directories together would add Year and Quarter columns
+    data = pd.concat(
+        [pd.read_parquet(os.path.join(root, path)) for partition in selected for path in partition["files"]],
+        ignore_index=True,
+    )
+    if date_range is not None:
+        order_date = pd.to_datetime(data["Order_Date"])
+        start, end = date_range
+        if start is not None:
+            data = data[order_date >= pd.Timestamp(start)]
+        if end is not None:
+            data = data[order_date <= pd.Timestamp(end)]
+    return data
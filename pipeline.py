@@ -0,0 +1,60 @@
+from collections import Counter, namedtuple
+
+import instrumentation
+
+# A named analysis step: func is called with the outputs of the tasks named in inputs
+Task = namedtuple("Task", ["name", "func", "inputs"])
+
+registry = {}
+
+
+# Register a function as a task; its output is stored under the function's name
+def task(*inputs, name=None):
+    def register(func):
+        task_name = name or func.__name__
+        if task_name in registry:
+            raise ValueError(f"Task {task_name} is already registered")
+        registry[task_name] = Task(task_name, func, inputs)
+        return func
+    return register
+
+
+# Dependency-first order of the tasks needed for targets; anything in provided is not recomputed
+def resolve_order(targets, provided=()):
+    order = []
+    state = {}
+
+    def visit(name, path):
+        if name in provided or state.get(name) == "done":
+            return
+        if state.get(name) == "visiting":
+            raise ValueError(f"Task cycle: {' -> '.join(path + [name])}")
+        if name not in registry:
+            raise KeyError(f"Unknown task: {name}")
+        state[name] = "visiting"
+        for dependency in registry[name].inputs:
+            visit(dependency, path + [name])
+        state[name] = "done"
+        order.append(name)
+
+    for target in targets:
+        visit(target, [])
+    return order
+
+
+# Run only what the targets need, computing each intermediate exactly once and letting
+# it go as soon as the last task that reads it has run
+def run(targets, provided=None):
+    values = dict(provided or {})
+    order = resolve_order(targets, values)
+    readers = Counter(dependency for name in order for dependency in registry[name].inputs)
+    for name in order:
+        current = registry[name]
+        with instrumentation.stage(f"task:{name}") as record:
+            values[name] = current.func(*[values[dependency] for dependency in current.inputs])
+            record["rows"] = instrumentation.row_count(values[name])
+        for dependency in current.inputs:
+            readers[dependency] -= 1
+            if not readers[dependency] and dependency not in targets:
+                del values[dependency]
+    return {target: values[target] for target in targets}
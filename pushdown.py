@@ -0,0 +1,132 @@
+import pandas as pd
+from sqlalchemy import create_engine
+
+import pipeline
+import reports
+
+# First day of the order's month, per SQL dialect
+month_expressions = {
+    "mssql": "DATEFROMPARTS(YEAR(s.Order_Date), MONTH(s.Order_Date), 1)",
+    "sqlite": "date(s.Order_Date, 'start of month')",
+}
+
+profit_expression = "s.Quantity * (p.Unit_Price_USD - p.Unit_Cost_USD)"
+revenue_expression = "s.Quantity * p.Unit_Price_USD"
+
+# Order lines the sales cube keeps: lines without a date, product or store are left out
+cube_lines_filter = "s.Order_Date IS NOT NULL AND s.ProductKey IS NOT NULL AND s.StoreKey IS NOT NULL"
+
+
+def monthly_sales_query(dialect):
+    month = month_expressions[dialect]
+    return f"""
+        SELECT {month} AS Month,
+               SUM({revenue_expression}) AS Revenue,
+               SUM({profit_expression}) AS Profit
+        FROM proj_sales s
+        LEFT JOIN proj_products p ON p.ProductKey = s.ProductKey
+        WHERE {cube_lines_filter}
+        GROUP BY {month}
+    """
+
+
+def region_revenue_query(dialect):
+    return f"""
+        SELECT st.State, st.Country, SUM({profit_expression}) AS Profit
+        FROM proj_sales s
+        LEFT JOIN proj_products p ON p.ProductKey = s.ProductKey
+        JOIN proj_stores st ON st.StoreKey = s.StoreKey
+        WHERE {cube_lines_filter} AND st.State IS NOT NULL AND st.Country IS NOT NULL
+        GROUP BY st.State, st.Country
+    """
+
+
+# StoreSize is summed per order line, matching the pandas report
+def state_performance_query(dialect):
+    return f"""
+        SELECT st.State, SUM({profit_expression}) AS Profit, SUM(st.Square_Meters) AS StoreSize
+        FROM proj_sales s
+        LEFT JOIN proj_products p ON p.ProductKey = s.ProductKey
+        JOIN proj_stores st ON st.StoreKey = s.StoreKey
+        WHERE {cube_lines_filter} AND st.State IS NOT NULL
+        GROUP BY st.State
+    """
+
+
+# SUM over no matching rows is NULL in SQL but 0 in pandas
+def numeric(data, columns):
+    for column in columns:
+        data[column] = pd.to_numeric(data[column]).astype("float64").fillna(0.0)
+    return data
+
+
+def monthly_sales(engine):
+    data = pd.read_sql(monthly_sales_query(engine.dialect.name), engine)
+    data['Month'] = pd.to_datetime(data['Month'])
+    return numeric(data, ['Revenue', 'Profit']).sort_values('Month', ignore_index=True)
+
+
+def region_revenue(engine):
+    data = numeric(pd.read_sql(region_revenue_query(engine.dialect.name), engine), ['Profit'])
+    return data.sort_values(by='Profit', ascending=False)
+
+
+def state_performance(engine):
+    data = pd.read_sql(state_performance_query(engine.dialect.name), engine)
+    data = numeric(data, ['Profit', 'StoreSize']).sort_values('State', ignore_index=True)
+    data['Efficiency'] = data['Profit'] / data['StoreSize']
+    return data
+
+
+# Pipeline outputs that can be computed in the database instead of from the sales cube
+pushdown_tasks = {
+    "monthly_sales": monthly_sales,
+    "region_revenue": region_revenue,
+    "state_performance": state_performance,
+}
+
+
+# Run the pushdown queries the targets actually need; the results are fed to pipeline.run
+# as provided values, so the cube is only built if some other report still needs it
+def pushdown_values(engine, targets, provided=()):
+    needed = set(pipeline.resolve_order(targets, provided))
+    values = {}
+    for name, query in pushdown_tasks.items():
+        if name in needed:
+            values[name] = query(engine)
+            print(f"Pushed down {name}: {values[name].shape[0]} rows")
+    return values
+
+
+# Compare every pushdown result with the pandas path, which stays the correctness oracle
+def verify(engine, provided):
+    expected = pipeline.run(list(pushdown_tasks), provided=provided)
+    mismatches = []
+    for name, query in pushdown_tasks.items():
+        actual = query(engine)
+        keys = [column for column in ['Month', 'State', 'Country'] if column in actual.columns]
+        left = expected[name].sort_values(keys, ignore_index=True)
+        right = actual.sort_values(keys, ignore_index=True)[list(left.columns)]
+        try:
+            pd.testing.assert_frame_equal(left, right, check_dtype=False, rtol=1e-6)
+            print(f"Pushdown {name} matches pandas ({right.shape[0]} rows)")
+        except AssertionError as e:
+            print(f"Pushdown {name} differs from pandas: {e}")
+            mismatches.append(name)
+    return mismatches
+
+
+# Local stand-in for SQL Server: the given frames loaded into SQLite
+def sqlite_standin(tables, path=":memory:"):
+    engine = create_engine(f"sqlite:///{path}")
+    for table_name, data in tables.items():
+        data.to_sql(table_name, engine, index=False, if_exists="replace")
+    return engine
+
+
+# Check the pushdown queries without SQL Server: the source's tables are copied into SQLite
+# and every query is compared with the pandas path on the same data
+def verify_sqlite(provided, path=":memory:"):
+    source = provided["source"]
+    tables = {table_name: source.load(table_name, reports.tables[table_name]) for table_name in ["proj_sales", "proj_products", "proj_stores"]}
+    return verify(sqlite_standin(tables, path), provided)
@@ -0,0 +1,114 @@
+import hashlib
+import inspect
+import io
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+
+# Headless backend; must be selected before pyplot is imported anywhere
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt
+import pandas as pd
+
+import instrumentation
+from charts import chart_kinds
+
+
+def render_chart(spec, output_dir):
+    start = time.perf_counter()
+    chart_kinds[spec.kind](spec.data, **spec.params)
+    plt.savefig(os.path.join(output_dir, spec.filename))
+    plt.close("all")
+    return spec.filename, time.perf_counter() - start
+
+
+# PNG bytes of one chart, for serving without touching the output directory
+def chart_png(spec):
+    chart_kinds[spec.kind](spec.data, **spec.params)
+    buffer = io.BytesIO()
+    plt.savefig(buffer, format="png")
+    plt.close("all")
+    return buffer.getvalue()
+
+
+def render_worker(args):
+    return render_chart(*args)
+
+
+# Hash of everything that determines the PNG: input frame, parameters and the drawing code.
+# Row labels are left out, as no chart plots the index, and floats are hashed at single
+# precision, far finer than any chart draws, so the last-bit differences between summing
+# in pandas and in DuckDB do not redraw a chart.
+def chart_hash(spec):
+    digest = hashlib.sha256()
+    digest.update(inspect.getsource(chart_kinds[spec.kind]).encode())
+    digest.update(spec.filename.encode())
+    digest.update(json.dumps(spec.params, sort_keys=True, default=str).encode())
+    digest.update(json.dumps([[str(column), str(dtype)] for column, dtype in spec.data.dtypes.items()]).encode())
+    data = spec.data.astype({column: "float32" for column, dtype in spec.data.dtypes.items() if dtype == "float64"})
+    digest.update(pd.util.hash_pandas_object(data, index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+# The manifest sits next to the output directory, e.g. visualizations_manifest.json
+def manifest_path(output_dir):
+    return os.path.normpath(output_dir) + "_manifest.json"
+
+
+def load_manifest(output_dir):
+    path = manifest_path(output_dir)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(output_dir, manifest):
+    path = manifest_path(output_dir)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+# Render every spec in a process pool; workers only ever see the small per-chart frames
+def render_charts(specs, output_dir, max_workers=None, use_cache=True):
+    os.makedirs(output_dir, exist_ok=True)
+    # Later specs win when two write the same file, so no two workers race on one PNG
+    specs = list({spec.filename: spec for spec in specs}.values())
+
+    # Skip charts whose inputs hash the same as the PNG already on disk
+    manifest = load_manifest(output_dir) if use_cache else {}
+    hashes = {spec.filename: chart_hash(spec) for spec in specs}
+    stale = [
+        spec for spec in specs
+        if manifest.get(spec.filename) != hashes[spec.filename]
+        or not os.path.exists(os.path.join(output_dir, spec.filename))
+    ]
+    if len(stale) < len(specs):
+        print(f"Skipping {len(specs) - len(stale)} unchanged charts")
+    specs = stale
+    if not specs:
+        return {}
+    max_workers = min(max_workers or os.cpu_count() or 1, len(specs))
+
+    start = time.perf_counter()
+    if max_workers == 1:
+        timings = [render_chart(spec, output_dir) for spec in specs]
+    else:
+        # Fork where available so workers do not re-import the calling script
+        context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as pool:
+            timings = list(pool.map(render_worker, [(spec, output_dir) for spec in specs]))
+    total = time.perf_counter() - start
+    print(f"Rendered {len(specs)} charts in {total:.2f}s on {max_workers} workers")
+    for filename, seconds in timings:
+        instrumentation.record(f"render:{filename}", seconds)
+
+    manifest.update({spec.filename: hashes[spec.filename] for spec in specs})
+    save_manifest(output_dir, manifest)
+    return dict(timings)
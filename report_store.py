@@ -0,0 +1,33 @@
+import json
+import os
+import time
+
+# Printed tables and chart paths of the last run of each report, for the CLI's --cached mode.
+# Plain JSON under the same root as data_cache, so serving it needs neither pandas nor matplotlib.
+results_dir = os.path.join(os.environ.get("SALES_CACHE_DIR", "cache"), "results")
+
+
+def result_path(report_name):
+    return os.path.join(results_dir, f"{report_name}.json")
+
+
+def save(report_name, tables, chart_paths):
+    os.makedirs(results_dir, exist_ok=True)
+    result = {
+        "report": report_name,
+        "saved_at": time.time(),
+        "tables": [[title, str(table)] for title, table in tables],
+        "charts": list(chart_paths),
+    }
+    path = result_path(report_name)
+    with open(path + ".tmp", "w") as f:
+        json.dump(result, f)
+    os.replace(path + ".tmp", path)
+
+
+def load(report_name):
+    try:
+        with open(result_path(report_name)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
@@ -0,0 +1,493 @@
+import pandas as pd
+
+import customers
+from anomalies import ranked_anomalies
+from catalog import ChartSpec, Report, report_names, report_task
+from cube import build_cube, build_dimensions, line_mean, roll_up, top_k
+from currency import build_rate_table
+from ingest import downcast_chunk, load_tables_parallel
+from partitions import load_partitions
+from pipeline import task
+from store_efficiency import StoreMonths, efficiency_ranks, load_store_months
+
+# Filter Data
+tables = {
+    "proj_customers": "CustomerKey, Name, Birthday",
+    "proj_sales": "Order_Date, Quantity, ProductKey, StoreKey, CustomerKey, Order_Number, Currency_Code",
+    "proj_products": "ProductKey, Product_Name, Unit_Price_USD, Unit_Cost_USD, Category",
+    "proj_exchange_rates": "Date, Exchange, Currency",
+    "proj_stores": "StoreKey, State, Country, Square_Meters"
+}
+
+# Ranking sizes, the quarters compared and the Q1/Q4 quantity window; the report API overrides them per call
+default_settings = {
+    "years": (2016, 2021),
+    "quarters": (1, 4),
+    "top_n": 5,
+    "top_quarter": 3,
+    "top_states": 5,
+}
+
+
+@task()
+def report_settings():
+    return dict(default_settings)
+
+
+# Year/Quarter partitions each report reads; reports not listed need every partition
+def report_scopes(settings):
+    first_year, last_year = settings["years"]
+    quarters = sorted(settings["quarters"])
+    return {
+        "q1_q4_profit": {"quarters": quarters},
+        "q1_q4_quantity": {"quarters": quarters, "years": list(range(first_year, last_year + 1))},
+    }
+
+
+# Smallest scope covering every selected report: None (read everything) if any of them is unscoped
+def scope_for(report_names, settings=None):
+    scopes = report_scopes(settings or default_settings)
+    if not report_names or any(name not in scopes for name in report_names):
+        return None
+    merged = {}
+    for key in ["years", "quarters"]:
+        if all(key in scopes[name] for name in report_names):
+            merged[key] = sorted(set().union(*(scopes[name][key] for name in report_names)))
+    return merged or None
+
+
+# Restriction of the sales load to some Year/Quarter partitions; None loads the whole table
+@task()
+def sales_scope():
+    return None
+
+
+# Load
+@task("source", "sales_scope")
+def raw_tables(source, sales_scope):
+    names = ["proj_sales", "proj_products", "proj_stores"]
+
+    def load_table(table_name, columns):
+        if table_name == "proj_sales" and sales_scope:
+            return load_partitions(source, columns, **sales_scope)
+        return source.load(table_name, columns)
+
+    data, _ = load_tables_parallel({name: tables[name] for name in names}, load_table, max_workers=source.pool_size)
+    return data
+
+
+@task("source")
+def customer_data(source):
+    data = source.load("proj_customers", tables["proj_customers"])
+    # Rename columns for consistency
+    return data.rename(columns={"Name": "CustomerName"})
+
+
+@task("source")
+def exchange_rates_data(source):
+    return source.load("proj_exchange_rates", tables["proj_exchange_rates"])
+
+
+# Compact fact table: integer keys, int16 quantity and Order_Date parsed once. Downcast in
+# place, so the loaded table is not held twice while raw_tables is still in use.
+@task("raw_tables")
+def sales_data(raw_tables):
+    return downcast_chunk(raw_tables["proj_sales"], categorize=False)
+
+
+def prepare_products(products):
+    product_data = products.rename(columns={"Product_Name": "ProductName"})
+    # Calculate revenue and profitability
+    product_data['revenue_per_unit'] = product_data['Unit_Price_USD'] - product_data['Unit_Cost_USD']
+    return product_data
+
+
+def prepare_stores(stores):
+    return stores.rename(columns={"Square_Meters": "StoreSize"})
+
+
+@task("raw_tables")
+def product_data(raw_tables):
+    return prepare_products(raw_tables["proj_products"])
+
+
+@task("raw_tables")
+def stores_data(raw_tables):
+    return prepare_stores(raw_tables["proj_stores"])
+
+
+@task("exchange_rates_data")
+def rate_table(exchange_rates_data):
+    return build_rate_table(exchange_rates_data)
+
+
+# Aggregate the order lines once; every report rolls up from this cube
+@task("sales_data", "product_data")
+def sales_cube(sales_data, product_data):
+    return build_cube(sales_data, product_data)
+
+
+# The same cube with local-currency measures, so only the currency report loads exchange rates
+@task("sales_data", "product_data", "rate_table")
+def currency_cube(sales_data, product_data, rate_table):
+    return build_cube(sales_data, product_data, rate_table)
+
+
+# Product and store attributes are joined onto aggregates, never onto the cube itself
+@task("product_data", "stores_data")
+def dimensions(product_data, stores_data):
+    return build_dimensions(product_data, stores_data)
+
+
+# Monthly Sales Trends
+@task("sales_cube")
+def monthly_sales(sales_cube):
+    return roll_up(sales_cube, 'Month', ['Revenue', 'Profit'])
+
+
+@task("monthly_sales")
+def report_monthly_trends(monthly_sales):
+    # High and low periods are annotated by the chart itself
+    return Report([], [ChartSpec("monthly_trends", "monthly_sales_and_profit_trends.png", monthly_sales)])
+
+
+# Regional Sales Performance
+@task("sales_cube", "dimensions")
+def region_revenue(sales_cube, dimensions):
+    region_revenue = roll_up(sales_cube, ['State', 'Country'], ['Profit'], dimensions)
+    return region_revenue.sort_values(by='Profit', ascending=False)
+
+
+@task("region_revenue")
+def report_regional(region_revenue):
+    return Report([], [ChartSpec("region_profit", "top_regions_by_profit.png", region_revenue.head(10))])
+
+
+# Dip Period Analysis
+@task("monthly_sales")
+def dip_periods(monthly_sales):
+    monthly_sales = monthly_sales.assign(Change=monthly_sales['Revenue'].diff())
+    return monthly_sales[monthly_sales['Change'] < 0].sort_values(by='Change').head(10)
+
+
+@task("dip_periods")
+def report_dips(dip_periods):
+    return Report([], [ChartSpec("dip_periods", "dip_periods_revenue.png", dip_periods)])
+
+
+# Dips and spikes in every product, store and state revenue series, ranked by z-score
+@task("sales_cube", "dimensions")
+def revenue_anomalies(sales_cube, dimensions):
+    return ranked_anomalies(sales_cube, dimensions)
+
+
+@task("revenue_anomalies")
+def report_anomalies(revenue_anomalies):
+    return Report([
+        ("Largest Revenue Anomalies:", revenue_anomalies.head(20)),
+        ("Anomalies by Level:", revenue_anomalies.groupby(['Level', 'Kind']).size().unstack(fill_value=0)),
+    ], [])
+
+
+# Top products overall by quantity and by profitability, ranked in one pass
+@task("sales_cube", "dimensions", "report_settings")
+def top_products(sales_cube, dimensions, report_settings):
+    k = report_settings["top_n"]
+    ranked = top_k(roll_up(sales_cube, "ProductName", ["Quantity", "Profit"], dimensions), [], ["Quantity", "Profit"], k)
+    return {metric: ranked[(metric, k)] for metric in ["Quantity", "Profit"]}
+
+
+@task("top_products")
+def top_products_quantity(top_products):
+    return top_products["Quantity"][["ProductName", "Quantity", "Profit"]]
+
+
+@task("top_products")
+def top_products_profitability(top_products):
+    return top_products["Profit"][["ProductName", "Profit", "Quantity"]]
+
+
+# Monthly series for the top products, legend sorted in ranking order
+def product_trend(sales_cube, dimensions, top_products, metric):
+    products = dimensions["ProductKey"]
+    top_keys = products.index[products['ProductName'].isin(top_products['ProductName'])]
+    top_sales = sales_cube[sales_cube['ProductKey'].isin(top_keys)]
+    trends = roll_up(top_sales, ['Month', 'ProductName'], [metric], dimensions)
+    trends['ProductName'] = pd.Categorical(
+        trends['ProductName'],
+        categories=top_products['ProductName'],
+        ordered=True
+    )
+    return trends
+
+
+@task("sales_cube", "dimensions", "top_products_quantity", "top_products_profitability")
+def report_top_products(sales_cube, dimensions, top_products_quantity, top_products_profitability):
+    charts = [
+        ChartSpec("product_trends", "top_products_quantity_over_time.png", product_trend(sales_cube, dimensions, top_products_quantity, "Quantity"), {
+            "y": "Quantity",
+            "hue_order": list(top_products_quantity['ProductName']),
+            "title": "Top Products by Quantity Sold Over Time",
+            "ylabel": "Quantity Sold",
+        }),
+        ChartSpec("product_trends", "top_products_profitability_over_time.png", product_trend(sales_cube, dimensions, top_products_profitability, "Profit"), {
+            "y": "Profit",
+            "hue_order": list(top_products_profitability['ProductName']),
+            "title": "Top Products by Profitability Over Time",
+            "ylabel": "Profit (USD)",
+            "palette": "cool",
+        }),
+    ]
+    return Report([
+        ("Top Products by Quantity Sold:", top_products_quantity[['ProductName', 'Quantity', 'Profit']]),
+        ("Top Products by Profitability:", top_products_profitability[['ProductName', 'Profit', 'Quantity']]),
+    ], charts)
+
+
+# Top 3 products by profitability for Q1 and Q4 of each year, with a discount flag
+@task("sales_cube", "dimensions", "report_settings")
+def q1_q4_comparison(sales_cube, dimensions, report_settings):
+    first, second = report_settings['quarters']
+    q1_sales = sales_cube[sales_cube['Quarter'] == first]
+    q4_sales = sales_cube[sales_cube['Quarter'] == second]
+
+    # Calculate average Unit Price for Q1 and Q4
+    avg_unit_price_q1 = line_mean(q1_sales, 'ProductName', 'Unit_Price_USD', dimensions).rename(f'Avg_Unit_Price_Q{first}')
+    avg_unit_price_q4 = line_mean(q4_sales, 'ProductName', 'Unit_Price_USD', dimensions).rename(f'Avg_Unit_Price_Q{second}')
+
+    # Top 3 per (Quarter, Year) for both quarters in one ranking pass
+    quarter_sales = sales_cube[sales_cube['Quarter'].isin([first, second])]
+    k = report_settings['top_quarter']
+    top_3_by_profit = top_k(roll_up(quarter_sales, ['Quarter', 'Year', 'ProductName'], ['Profit'], dimensions), ['Quarter', 'Year'], 'Profit', k)[('Profit', k)]
+    top_3_by_profit['Quarter'] = 'Q' + top_3_by_profit['Quarter'].astype(str)
+
+    # Merge Q1 and Q4 prices into comparison_data
+    comparison_data = top_3_by_profit[['Year', 'ProductName', 'Profit', 'Quarter']]
+    comparison_data = comparison_data.merge(avg_unit_price_q1, on='ProductName', how='left')
+    comparison_data = comparison_data.merge(avg_unit_price_q4, on='ProductName', how='left')
+
+    # Determine if Q4 price is lower than Q1 price for discounts
+    comparison_data['Discounted'] = comparison_data[f'Avg_Unit_Price_Q{second}'] < comparison_data[f'Avg_Unit_Price_Q{first}']
+    return comparison_data
+
+
+@task("sales_cube")
+def years(sales_cube):
+    return sales_cube['Year'].dropna().unique()
+
+
+@task("q1_q4_comparison", "years", "report_settings")
+def report_q1_q4_profit(comparison_data, years, report_settings):
+    first, second = report_settings['quarters']
+    charts = [
+        ChartSpec("q1_q4_discounts", f"top_products_profit_q{first}_vs_q{second}_{int(year)}_discounts.png", comparison_data[comparison_data['Year'] == year], {
+            "year": year, "quarters": (f"Q{first}", f"Q{second}"),
+        })
+        for year in years
+    ]
+    return Report([], charts)
+
+
+# Top 3 most bought products in Q1 and Q4 of each year, 2016-2021
+@task("sales_cube", "dimensions", "report_settings")
+def q1_q4_top_quantity(sales_cube, dimensions, report_settings):
+    first_year, last_year = report_settings['years']
+    k = report_settings['top_quarter']
+    sales_data_filtered = sales_cube[(sales_cube['Year'] >= first_year) & (sales_cube['Year'] <= last_year) & sales_cube['Quarter'].isin(report_settings['quarters'])]
+    quantity = roll_up(sales_data_filtered, ['Quarter', 'Year', 'ProductName'], ['Quantity'], dimensions)
+    top_3_products_by_quantity = top_k(quantity, ['Quarter', 'Year'], 'Quantity', k)[('Quantity', k)]
+    top_3_products_by_quantity['Quarter'] = 'Q' + top_3_products_by_quantity['Quarter'].astype(str)
+    return top_3_products_by_quantity[['Year', 'ProductName', 'Quantity', 'Quarter']]
+
+
+@task("q1_q4_top_quantity", "report_settings")
+def report_q1_q4_quantity(top_quantity, report_settings):
+    first, second = report_settings['quarters']
+    # Years follow the Q1 ranking, as each chart compares Q4 against it
+    years = top_quantity.loc[top_quantity['Quarter'] == f'Q{first}', 'Year'].unique()
+    charts = [
+        ChartSpec("q1_q4_quantity", f"top_3_products_q{first}_vs_q{second}_{year}.png", top_quantity[top_quantity['Year'] == year], {
+            "year": year, "quarters": (f"Q{first}", f"Q{second}"),
+        })
+        for year in years
+    ]
+    return Report([], charts)
+
+
+# Top 5 products by profit and by quantity per year, from one roll-up and one ranking pass
+@task("sales_cube", "dimensions", "report_settings")
+def yearly_top_products(sales_cube, dimensions, report_settings):
+    k = report_settings['top_n']
+    ranked = top_k(roll_up(sales_cube, ['Year', 'ProductName'], ['Profit', 'Quantity'], dimensions), 'Year', ['Profit', 'Quantity'], k)
+    return {metric: ranked[(metric, k)] for metric in ['Profit', 'Quantity']}
+
+
+@task("yearly_top_products")
+def top_5_products_profit(yearly_top_products):
+    return yearly_top_products['Profit'][['Year', 'ProductName', 'Profit']]
+
+
+@task("yearly_top_products")
+def top_5_products_quantity(yearly_top_products):
+    return yearly_top_products['Quantity'][['Year', 'ProductName', 'Quantity']]
+
+
+@task("top_5_products_profit", "top_5_products_quantity", "years")
+def report_top_products_by_year(top_5_products_profit, top_5_products_quantity, years):
+    charts = []
+    for year in years:
+        charts.append(ChartSpec("ranked_bar", f"top_5_products_profit_{int(year)}.png", top_5_products_profit[top_5_products_profit['Year'] == year], {
+            "x": "ProductName", "y": "Profit", "palette": "Blues_d", "rotate_labels": True,
+            "title": f"Top 5 Products by Profit in {int(year)}", "xlabel": "Product Name", "ylabel": "Profit (USD)",
+        }))
+        charts.append(ChartSpec("ranked_bar", f"top_5_products_quantity_{int(year)}.png", top_5_products_quantity[top_5_products_quantity['Year'] == year], {
+            "x": "ProductName", "y": "Quantity", "palette": "Greens_d", "rotate_labels": True,
+            "title": f"Top 5 Products by Quantity in {int(year)}", "xlabel": "Product Name", "ylabel": "Quantity Sold",
+        }))
+    return Report([
+        ("Top 5 Products by Profit Per Year:", top_5_products_profit),
+        ("Top 5 Products by Quantity Per Year:", top_5_products_quantity),
+    ], charts)
+
+
+# Calculate state performance
+# StoreSize is summed per order line, recovered from each store's line count
+@task("sales_cube", "stores_data")
+def state_performance(sales_cube, stores_data):
+    per_store = roll_up(sales_cube, 'StoreKey', ['Profit', 'Lines']).merge(stores_data, on='StoreKey')
+    per_store['StoreSize'] = per_store['StoreSize'] * per_store['Lines']
+    state_performance = per_store.groupby('State').agg({
+        'Profit': 'sum',
+        'StoreSize': 'sum'
+    }).reset_index()
+    state_performance['Efficiency'] = state_performance['Profit'] / state_performance['StoreSize']
+    return state_performance
+
+
+# Combine top 5 profitable and efficient states
+@task("state_performance", "report_settings")
+def top_states_combined(state_performance, report_settings):
+    top_5_states_profit = state_performance.nlargest(report_settings['top_states'], 'Profit')
+    top_5_states_efficiency = state_performance.nlargest(report_settings['top_states'], 'Efficiency')
+    top_states_combined = pd.concat([top_5_states_profit, top_5_states_efficiency]).drop_duplicates(subset=['State'])
+    top_states_combined['Metric'] = ['Profit' if state in top_5_states_profit['State'].values else 'Efficiency' for state in top_states_combined['State']]
+    return top_states_combined
+
+
+# Top 5 products by profit and quantity for top states
+@task("sales_cube", "dimensions", "top_states_combined", "report_settings")
+def top_products_top_states(sales_cube, dimensions, top_states_combined, report_settings):
+    stores = dimensions["StoreKey"]
+    top_store_keys = stores.index[stores['State'].isin(top_states_combined['State'])]
+    state_products = roll_up(sales_cube[sales_cube['StoreKey'].isin(top_store_keys)], ['State', 'ProductName'], ['Profit', 'Quantity'], dimensions)
+    k = report_settings['top_n']
+    return top_k(state_products, 'State', 'Profit', k)[('Profit', k)]
+
+
+@task("state_performance", "top_states_combined", "top_products_top_states", "report_settings")
+def report_states(state_performance, top_states_combined, top_products_top_states, report_settings):
+    n = report_settings['top_states']
+    charts = [
+        ChartSpec("ranked_bar", "top_5_states_profit.png", state_performance.nlargest(n, 'Profit'), {
+            "x": "State", "y": "Profit", "palette": "Purples_d",
+            "title": f"Top {n} States by Profit", "xlabel": "State", "ylabel": "Profit (USD)",
+        }),
+        ChartSpec("ranked_bar", "top_5_states_efficiency.png", state_performance.nlargest(n, 'Efficiency'), {
+            "x": "State", "y": "Efficiency", "palette": "Oranges_d",
+            "title": f"Top {n} Efficient States by Profit per Square Meter", "xlabel": "State", "ylabel": "Efficiency (Profit/Square Meter)",
+        }),
+        ChartSpec("combined_states", "combined_top_states.png", top_states_combined),
+    ]
+
+    # Top 5 by both Profit and Quantity for each state
+    for state in top_products_top_states['State'].unique():
+        state_data = top_products_top_states[top_products_top_states['State'] == state]
+        charts.append(ChartSpec("state_products", f"top_5_products_combined_{state}.png", state_data, {"state": state}))
+    return Report([], charts)
+
+
+# Store x month Profit and Lines over the whole history, kept on disk and fed only the
+# order lines of new sales files, so this report never loads the full sales table.
+# A --year/--quarter scope builds them from just those partitions instead.
+@task("source", "sales_scope")
+def store_months(source, sales_scope):
+    products = prepare_products(source.load("proj_products", tables["proj_products"]))
+    if sales_scope:
+        return StoreMonths().add(build_cube(load_partitions(source, tables["proj_sales"], **sales_scope), products))
+    return load_store_months(source, products, tables["proj_sales"])
+
+
+@task("source")
+def store_sizes(source):
+    return prepare_stores(source.load("proj_stores", tables["proj_stores"]))
+
+
+# Profit per square meter over trailing 3 and 12 months, ranked across stores and countries
+@task("store_months", "store_sizes")
+def store_efficiency(store_months, store_sizes):
+    ranked = efficiency_ranks(store_months, store_sizes)
+    return ranked.merge(store_sizes[['StoreKey', 'Country', 'State', 'StoreSize']], on='StoreKey', how='left')
+
+
+@task("store_months", "store_sizes")
+def country_efficiency(store_months, store_sizes):
+    return efficiency_ranks(store_months, store_sizes, by='Country')
+
+
+@task("store_efficiency", "country_efficiency")
+def report_store_efficiency(store_efficiency, country_efficiency):
+    return Report([
+        ("Most Efficient Stores (Profit per Square Meter):", store_efficiency.head(10)),
+        ("Least Efficient Stores (Profit per Square Meter):", store_efficiency.tail(10)),
+        ("Country Efficiency (Profit per Square Meter):", country_efficiency),
+    ], [])
+
+
+# Revenue and Profit per order currency, in USD and in that currency at order-date rates
+@task("currency_cube")
+def currency_revenue(currency_cube):
+    currency_revenue = roll_up(currency_cube, ['Year', 'Currency_Code'], ['Revenue', 'Revenue_Local', 'Profit', 'Profit_Local'])
+    currency_revenue['Avg_Rate'] = currency_revenue['Revenue_Local'] / currency_revenue['Revenue']
+    return currency_revenue
+
+
+@task("currency_revenue")
+def report_currency(currency_revenue):
+    return Report([("Revenue and Profit by Order Currency:", currency_revenue)], [])
+
+
+# Customer analytics: one summary pass over the order lines, then RFM, cohorts and age bands
+@task("sales_data", "product_data")
+def customer_summary(sales_data, product_data):
+    return customers.summarize(sales_data, product_data)
+
+
+@task("customer_summary")
+def customer_rfm(customer_summary):
+    return customers.rfm_scores(customer_summary.customers)
+
+
+@task("customer_summary")
+def cohort_retention(customer_summary):
+    return customers.cohort_retention(customer_summary)
+
+
+@task("customer_summary", "customer_data")
+def age_band_revenue(customer_summary, customer_data):
+    return customers.age_band_revenue(customer_summary.customers, customer_data)
+
+
+@task("customer_rfm", "cohort_retention", "age_band_revenue")
+def report_customers(customer_rfm, cohort_retention, age_band_revenue):
+    rfm_summary = customer_rfm.groupby('RFM_Score').agg(
+        Customers=('CustomerKey', 'size'),
+        Recency=('Recency', 'mean'),
+        Frequency=('Frequency', 'mean'),
+        Monetary=('Monetary', 'mean'),
+    ).reset_index()
+    # First year after acquisition; the chart keeps cohort months as text labels
+    first_year = cohort_retention.loc[:, cohort_retention.columns <= 12]
+    return Report([
+        ("Customers by RFM Score:", rfm_summary),
+        ("Revenue by Age Band:", age_band_revenue),
+    ], [ChartSpec("cohort_retention", "customer_cohort_retention.png", first_year.rename(index=str))])
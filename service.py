@@ -0,0 +1,165 @@
+import argparse
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+import reports
+from api import ReportService
+from rendering import chart_hash, chart_png
+from result_cache import ResultCache
+
+# Query parameters that are not filters
+date_parameters = {"start", "end"}
+setting_parameters = {"k", "years", "quarters", "top_n", "top_quarter", "top_states"}
+
+
+def parse_value(value):
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+# ?start=2019-01&end=2019-12&k=10&Country=Germany&Country=France -> report() arguments
+def report_arguments(query):
+    start, end = query.get("start"), query.get("end")
+    arguments = {"date_range": (start, end) if start or end else None}
+    for name in setting_parameters & set(query):
+        value = query[name]
+        arguments[name] = tuple(int(part) for part in value.split(",")) if name in ("years", "quarters") else int(value)
+    arguments["filters"] = {
+        column: [parse_value(value) for value in query.getall(column)]
+        for column in query.keys() if column not in date_parameters | setting_parameters
+    }
+    return arguments
+
+
+# {"output": [records...]} without a round trip through Python objects
+def frames_json(frames):
+    parts = []
+    for output, frame in frames.items():
+        if frame.index.name is not None or frame.index.names[0] is not None:
+            frame = frame.reset_index()
+        frame.columns = [str(column) for column in frame.columns]
+        for column in frame.columns:
+            if str(frame[column].dtype).startswith("period"):
+                frame[column] = frame[column].astype(str)
+        parts.append(f"{json.dumps(output)}:{frame.to_json(orient='records', date_format='iso')}")
+    return "{" + ",".join(parts) + "}"
+
+
+def error_response(status, message):
+    return web.json_response({"error": message}, status=status)
+
+
+class SalesService:
+    def __init__(self, source, reload_interval=30.0, dimension_interval=600.0, max_entries=256, max_bytes=512 * 1024 ** 2):
+        self.reports = ReportService(
+            source, max_entries=max_entries, max_bytes=max_bytes,
+            version_interval=reload_interval, dimension_interval=dimension_interval,
+        )
+        self.reload_interval = reload_interval
+        # PNGs keyed by chart content, so a data reload never serves a stale image
+        self.pngs = ResultCache(max_entries=max_entries, max_bytes=max_bytes // 4)
+        # Slicing runs on a thread pool; pyplot keeps global state, so charts get one thread
+        self.workers = ThreadPoolExecutor()
+        self.renderer = ThreadPoolExecutor(max_workers=1)
+
+    def run(self, func, *args, **kwargs):
+        return asyncio.get_running_loop().run_in_executor(self.workers, lambda: func(*args, **kwargs))
+
+    # Load the aggregates and compute every report's default slice before serving
+    def warm(self):
+        self.reports.base_values()
+        for name in reports.report_names:
+            self.reports.report(name)
+
+    async def watch(self, app):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            version = self.reports.version
+            try:
+                # Only the versions whose interval has passed are queried
+                await self.run(self.reports.base_values)
+            except Exception as e:
+                print(f"Reload failed: {e}")
+                continue
+            if self.reports.version != version:
+                print("Data changed, reloaded sales aggregates")
+                await self.run(self.warm)
+
+    async def on_startup(self, app):
+        await self.run(self.warm)
+        app["watcher"] = asyncio.create_task(self.watch(app))
+
+    async def on_cleanup(self, app):
+        app["watcher"].cancel()
+        self.workers.shutdown(wait=False)
+        self.renderer.shutdown(wait=False)
+
+    async def list_reports(self, request):
+        return web.json_response({"reports": reports.report_names, "version": str(self.reports.version)})
+
+    async def health(self, request):
+        return web.json_response({"version": str(self.reports.version), "reports": self.reports.cache.stats(), "charts": self.pngs.stats()})
+
+    async def report(self, request):
+        try:
+            frames = await self.run(self.reports.report, request.match_info["name"], **report_arguments(request.query))
+        except ValueError as e:
+            return error_response(400, str(e))
+        return web.Response(text=frames_json(frames), content_type="application/json")
+
+    async def chart_list(self, request):
+        try:
+            charts = await self.run(self.reports.charts, request.match_info["name"], **report_arguments(request.query))
+        except ValueError as e:
+            return error_response(400, str(e))
+        return web.json_response({"charts": list(charts)})
+
+    async def chart(self, request):
+        try:
+            charts = await self.run(self.reports.charts, request.match_info["name"], **report_arguments(request.query))
+        except ValueError as e:
+            return error_response(400, str(e))
+        spec = charts.get(request.match_info["filename"])
+        if spec is None:
+            return error_response(404, f"Unknown chart: {request.match_info['filename']}")
+        key = chart_hash(spec)
+        png = self.pngs.get(key)
+        if png is None:
+            png = await asyncio.get_running_loop().run_in_executor(self.renderer, chart_png, spec)
+            self.pngs.put(key, png)
+        return web.Response(body=png, content_type="image/png")
+
+    def app(self):
+        app = web.Application()
+        app.add_routes([
+            web.get("/reports", self.list_reports),
+            web.get("/health", self.health),
+            web.get("/reports/{name}", self.report),
+            web.get("/reports/{name}/charts", self.chart_list),
+            web.get("/reports/{name}/charts/{filename}", self.chart),
+        ])
+        app.on_startup.append(self.on_startup)
+        app.on_cleanup.append(self.on_cleanup)
+        return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve sales report slices and charts over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--reload-interval", type=float, default=30.0, help="seconds between checks of the sales watermark")
+    parser.add_argument("--dimension-interval", type=float, default=600.0, help="seconds between fingerprints of the product, store, customer and rate tables")
+    args = parser.parse_args(argv)
+
+    from visualizations import build_source
+    service = SalesService(build_source(), reload_interval=args.reload_interval, dimension_interval=args.dimension_interval)
+    web.run_app(service.app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
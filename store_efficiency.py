@@ -0,0 +1,188 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import data_cache
+from cube import build_cube, roll_up
+from data_sources import parse_columns
+from partitions import source_versions
+
+# Trailing windows, in months, that efficiency is reported over
+windows = (3, 12)
+
+matrix_names = ["profit", "lines", "profit_totals", "lines_totals"]
+
+
+# Profit and order lines per store and month as dense StoreKey x month matrices, with running
+# totals along the months so any trailing window is one subtraction. New months (or late
+# lines for months already held) are added in place from a cube of just those order lines,
+# so the matrices never need rebuilding from the full sales history.
+class StoreMonths:
+    def __init__(self):
+        self.stores = pd.Index([], name="StoreKey")
+        self.months = pd.DatetimeIndex([], name="Month")
+        self.profit = np.zeros((0, 0))
+        self.lines = np.zeros((0, 0))
+        # Column j holds the totals of months [0, j), so there is one more column than months
+        self.profit_totals = np.zeros((0, 1))
+        self.lines_totals = np.zeros((0, 1))
+
+    # Add a cube's Profit and Lines, e.g. StoreMonths().add(sales_cube) or .add(build_cube(new_lines, product_data))
+    def add(self, sales_cube):
+        cells = roll_up(sales_cube, ["StoreKey", "Month"], ["Profit", "Lines"])
+        if cells.empty:
+            return self
+        self.extend(pd.Index(cells["StoreKey"].unique()), cells["Month"].min(), cells["Month"].max())
+
+        rows = self.stores.get_indexer(cells["StoreKey"])
+        columns = self.months.get_indexer(cells["Month"])
+        np.add.at(self.profit, (rows, columns), cells["Profit"].to_numpy(dtype="float64"))
+        np.add.at(self.lines, (rows, columns), cells["Lines"].to_numpy(dtype="float64"))
+
+        # Only the running totals from the earliest changed month onwards move
+        first = columns.min()
+        for values, totals in [(self.profit, self.profit_totals), (self.lines, self.lines_totals)]:
+            totals[:, first + 1:] = totals[:, first:first + 1] + np.cumsum(values[:, first:], axis=1)
+        return self
+
+    # Grow the matrices to hold new stores (as new rows) and months outside the current range
+    def extend(self, stores, start, end):
+        new_stores = stores.difference(self.stores)
+        if len(self.months):
+            start, end = min(start, self.months[0]), max(end, self.months[-1])
+        months = pd.date_range(start, end, freq="MS", name="Month")
+        before = 0 if not len(self.months) else months.get_loc(self.months[0])
+        after = len(months) - len(self.months) - before
+        if not len(new_stores) and not before and not after:
+            return
+
+        padding = ((0, len(new_stores)), (before, after))
+        self.profit = np.pad(self.profit, padding)
+        self.lines = np.pad(self.lines, padding)
+        for name, values in [("profit_totals", self.profit), ("lines_totals", self.lines)]:
+            if before:
+                # Months added in front shift every running total, so those are recomputed in full
+                totals = np.cumsum(np.pad(values, ((0, 0), (1, 0))), axis=1)
+            else:
+                # New stores start at zero and empty months at the end carry the last total
+                totals = np.pad(getattr(self, name), ((0, len(new_stores)), (0, 0)))
+                totals = np.pad(totals, ((0, 0), (0, after)), mode="edge")
+            setattr(self, name, totals)
+        self.stores = self.stores.append(new_stores).rename("StoreKey")
+        self.months = months
+
+    # Sum of the `window` months up to and including each month (NaN before a full window)
+    def trailing(self, totals, window):
+        sums = np.full((totals.shape[0], totals.shape[1] - 1), np.nan)
+        if sums.shape[1] >= window:
+            sums[:, window - 1:] = totals[:, window:] - totals[:, :-window]
+        return sums
+
+    def trailing_profit(self, window):
+        return self.trailing(self.profit_totals, window)
+
+    def trailing_lines(self, window):
+        return self.trailing(self.lines_totals, window)
+
+
+def store_months_path():
+    return os.path.join(data_cache.cache_dir, "store_months.npz")
+
+
+# Matrices, labels and meta in one file, replaced whole so a crash never leaves them out of step
+def save_store_months(store_months, path, meta):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+        np.savez(
+            f,
+            stores=store_months.stores.to_numpy(),
+            months=store_months.months.to_numpy(dtype="datetime64[ns]"),
+            meta=np.array(json.dumps(meta)),
+            **{name: getattr(store_months, name) for name in matrix_names},
+        )
+    os.replace(path + ".tmp", path)
+
+
+def read_store_months(path):
+    try:
+        with np.load(path) as saved:
+            store_months = StoreMonths()
+            store_months.stores = pd.Index(saved["stores"], name="StoreKey")
+            store_months.months = pd.DatetimeIndex(saved["months"], name="Month")
+            for name in matrix_names:
+                setattr(store_months, name, saved[name])
+            return store_months, json.loads(str(saved["meta"]))
+    except (FileNotFoundError, ValueError, KeyError):
+        return None, None
+
+
+# The full-history matrices, kept on disk and fed only the order lines of source files they
+# have not seen (new parts of the incremental sales store). They are rebuilt when a file
+# already added changed or went away, or the column list or product margins changed.
+def load_store_months(source, product_data, columns, table_name="proj_sales"):
+    path = store_months_path()
+    files = list(source.parquet_files(table_name, columns))
+    versions = source_versions(files)
+    margins = product_data[["ProductKey", "revenue_per_unit"]]
+    products = str(int(pd.util.hash_pandas_object(margins, index=False).sum()))
+
+    store_months, meta = read_store_months(path)
+    if (
+        store_months is None or meta["columns"] != columns or meta["products"] != products
+        or any(versions.get(file) != version for file, version in meta["sources"].items())
+    ):
+        store_months, meta = StoreMonths(), {"columns": columns, "products": products, "sources": {}}
+    new_files = [file for file in files if file not in meta["sources"]]
+    if new_files:
+        lines = pd.read_parquet(new_files, columns=parse_columns(columns))
+        store_months.add(build_cube(lines, product_data))
+        meta["sources"].update(source_versions(new_files))
+        save_store_months(store_months, path, meta)
+        print(f"Added {lines.shape[0]} order lines to the store x month matrices")
+    return store_months
+
+
+# Profit per square meter for every (store or country, month) over the trailing window.
+# A store counts only in windows it traded in, so unopened or closed stores are left out
+# rather than ranked at zero; stores without a floor area (online) are never counted.
+def efficiency(store_months, stores_data, window, by="StoreKey"):
+    size = stores_data.set_index("StoreKey")["StoreSize"].reindex(store_months.stores).to_numpy(dtype="float64")
+    profit = store_months.trailing_profit(window)
+    trading = (store_months.trailing_lines(window) > 0) & (size > 0)[:, None]
+    if by == "StoreKey":
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values = np.where(trading, profit / size[:, None], np.nan)
+        return pd.DataFrame(values, index=store_months.stores, columns=store_months.months)
+
+    groups = stores_data.set_index("StoreKey")[by].reindex(store_months.stores)
+    codes, labels = pd.factorize(groups, sort=True)
+    counted = codes >= 0
+    group_profit = np.zeros((len(labels), len(store_months.months)))
+    group_size = np.zeros_like(group_profit)
+    np.add.at(group_profit, codes[counted], np.where(trading, profit, 0.0)[counted])
+    np.add.at(group_size, codes[counted], np.where(trading, size[:, None], 0.0)[counted])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        values = np.where(group_size > 0, group_profit / group_size, np.nan)
+    return pd.DataFrame(values, index=pd.Index(labels, name=by), columns=store_months.months)
+
+
+# Efficiency and its percentile rank among the stores or countries trading in that month,
+# over each trailing window, as one row per store or country for the given month (default the latest)
+def efficiency_ranks(store_months, stores_data, by="StoreKey", month=None):
+    # A slice with no sales has no months to rank
+    if not len(store_months.months):
+        columns = [by, "Month"] + [f"{name}_{window}M" for window in windows for name in ["Efficiency", "Percentile"]]
+        return pd.DataFrame(columns=columns)
+    month = store_months.months[-1] if month is None else pd.Timestamp(month)
+    ranked = []
+    for window in windows:
+        values = efficiency(store_months, stores_data, window, by)[month]
+        ranked.append(pd.DataFrame({
+            f"Efficiency_{window}M": values,
+            f"Percentile_{window}M": values.rank(pct=True),
+        }))
+    ranked = pd.concat(ranked, axis=1).dropna(how="all")
+    ranked.insert(0, "Month", month)
+    return ranked.sort_values(f"Percentile_{windows[-1]}M", ascending=False, kind="stable").reset_index()